@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from core import Ledger
+from storage import migrate_json_to_sqlite, partition_json, period_range
+
+# (name, share of expenses, typical amount in VND, whether it is a monthly bill paid on the 5th)
+CATEGORIES = [
+    ('An uong', 0.45, 60000, False),
+    ('Di chuyen', 0.20, 40000, False),
+    ('Giai tri', 0.10, 250000, False),
+    ('Mua sam', 0.15, 400000, False),
+    ('Suc khoe', 0.05, 300000, False),
+    ('Nha o', 0.02, 3000000, True),
+    ('Tien dien', 0.015, 450000, True),
+    ('Tien nuoc', 0.015, 120000, True),
+]
+INCOME = [('Luong', 0.7, 12000000), ('Lam them', 0.25, 2500000), ('Thuong', 0.05, 5000000)]
+BACKENDS = ('json', 'journal', 'sqlite', 'partitioned')
+
+
+def generate_ledger(path, size, seed=0, end=date(2024, 12, 31)):
+    # About 30 records a day, so larger ledgers span more years, as real ones do.
+    rng = random.Random(seed)
+    days = max(365, size // 30)
+    start = end - timedelta(days=days)
+    weights = [share for _, share, _, _ in CATEGORIES]
+
+    def random_day():
+        # Skew towards recent dates: ledgers grow over time.
+        return start + timedelta(days=int(days * rng.random() ** 0.7))
+
+    with open(path, 'w') as f:
+        f.write('{"categories": ')
+        json.dump([{'id': i + 1, 'name': name, 'description': ''} for i, (name, _, _, _) in enumerate(CATEGORIES)], f)
+        f.write(', "expenses": [')
+        for i in range(size):
+            category = rng.choices(range(len(CATEGORIES)), weights)[0]
+            _, _, typical, monthly = CATEGORIES[category]
+            day = random_day()
+            if monthly:
+                day = day.replace(day=5)
+            record = {'id': i + 1, 'amount': round(typical * rng.lognormvariate(0, 0.5), -3),
+                      'description': f"chi tieu {i}", 'category_id': category + 1, 'date': day.isoformat()}
+            f.write((', ' if i else '') + json.dumps(record))
+        f.write('], "income": [')
+        for i in range(max(1, size // 20)):
+            name, _, typical = rng.choices(INCOME, [share for _, share, _ in INCOME])[0]
+            record = {'id': i + 1, 'amount': round(typical * rng.lognormvariate(0, 0.3), -3),
+                      'description': name, 'date': random_day().isoformat()}
+            f.write((', ' if i else '') + json.dumps(record))
+        f.write(']}')
+    return start.isoformat(), end.isoformat()
+
+
+def timed(repeat, func, *args):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run_case(workdir, ledger, size, backend, repeat):
+    file_name = os.path.join(workdir, {'sqlite': 'ledger.db', 'partitioned': 'ledger' + os.sep}.get(backend, 'ledger.json'))
+    shutil.rmtree(os.path.join(workdir, 'ledger'), ignore_errors=True)
+    for suffix in ('', '.log', '.tmp'):
+        if os.path.isfile(file_name + suffix):
+            os.remove(file_name + suffix)
+    if backend == 'sqlite':
+        migrate_json_to_sqlite(ledger, file_name).close()
+    elif backend == 'partitioned':
+        partition_json(ledger, file_name)
+    else:
+        shutil.copy(ledger, file_name)
+
+    results = {}
+    started = time.perf_counter()
+    manager = Ledger(file_name, journal=backend == 'journal')
+    results['open'] = [time.perf_counter() - started]
+    results['load_data'] = timed(repeat, manager.load_data)
+    results['save_data'] = timed(repeat, manager.save_data)
+
+    years = manager.backend.years('expenses')
+    year = years[len(years) // 2]
+    month = f"{year}-{manager.backend.months('expenses', year)[0]}"
+    day = manager.backend.query('expenses', *period_range('Thang', month))[0]['date']
+    category = manager.category_names()[0]
+    today = datetime(int(year), 6, 15)
+
+    def add_expense():
+        return manager.add_expense(123000, 'benchmark', category, today)
+
+    def add_income():
+        return manager.add_income(5000000, 'benchmark', today)
+
+    results['add_expense'] = timed(repeat, add_expense)
+    results['add_income'] = timed(repeat, add_income)
+    ids = [add_expense() for _ in range(repeat)]
+    results['update_expense'] = timed(1, lambda: [manager.update_expense(i, 1000, 'u', category, today) for i in ids])
+    results['delete_expense'] = timed(1, lambda: [manager.delete_expense(i) for i in ids])
+    results['update_expense'] = [results['update_expense'][0] / repeat]
+    results['delete_expense'] = [results['delete_expense'][0] / repeat]
+    results['add_category'] = timed(1, manager.add_category, 'Benchmark', '')
+    results['update_category'] = timed(1, manager.update_category, 'Benchmark', 'Benchmark 2', '')
+    results['delete_category'] = timed(1, manager.delete_category, 'Benchmark 2')
+
+    for period in ('Ngay', 'Thang', 'Nam'):
+        results[f'summarize_expenses_{period}'] = timed(repeat, manager.summarize_expenses, period)
+        results[f'summarize_income_{period}'] = timed(repeat, manager.summarize_income, period)
+    results['list_day'] = timed(repeat, manager.backend.query, 'expenses', *period_range('Ngay', day))
+    results['list_month'] = timed(repeat, manager.backend.query, 'expenses', *period_range('Thang', month))
+    results['list_year'] = timed(repeat, manager.backend.query, 'expenses', *period_range('Nam', year))
+    results['list_page'] = timed(repeat, manager.page, 'expenses')
+    results['list_page_search'] = timed(repeat, manager.page, 'expenses', None, None, 'chi tieu 1')
+    results['years'] = timed(repeat, manager.backend.years, 'expenses')
+    results['line_aggregation'] = timed(repeat, lambda: (manager.summarize_expenses('Thang', f"{year}-01-01", f"{year}-12-31"),
+                                                          manager.summarize_income('Thang', f"{year}-01-01", f"{year}-12-31")))
+    results['pie_aggregation_month'] = timed(repeat, manager.backend.category_totals, *period_range('Thang', month))
+    results['pie_aggregation_day'] = timed(repeat, manager.backend.category_totals, *period_range('Ngay', day))
+    manager.charts.entries.clear()
+    results['line_chart_render'] = timed(1, manager.line_chart, 'Thang', (f"{year}-01", f"{year}-12"))
+    results['line_chart_cached'] = timed(repeat, manager.line_chart, 'Thang', (f"{year}-01", f"{year}-12"))
+    if backend == 'sqlite':
+        manager.backend.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ledger core on synthetic ledgers.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="number of expense records per ledger (10000000 works but needs several GB)")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    report = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': [],
+    }
+    workdir = tempfile.mkdtemp(prefix='qlct-bench-')
+    try:
+        for size in args.sizes:
+            ledger = os.path.join(workdir, f'synthetic-{size}.json')
+            started = time.perf_counter()
+            generate_ledger(ledger, size, args.seed)
+            print(f"generated {size} records in {time.perf_counter() - started:.1f}s")
+            for backend in args.backends:
+                for op, samples in run_case(workdir, ledger, size, backend, args.repeat).items():
+                    report['results'].append({
+                        'size': size,
+                        'backend': backend,
+                        'op': op,
+                        'median': statistics.median(samples),
+                        'min': min(samples),
+                        'samples': samples,
+                    })
+                    print(f"{size:>9} {backend:<8} {op:<28} {statistics.median(samples) * 1000:10.2f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
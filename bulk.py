@@ -0,0 +1,65 @@
+import csv
+import json
+import math
+import os
+from datetime import date
+
+FIELDS = {
+    'income': ['id', 'date', 'amount', 'description'],
+    'expenses': ['id', 'date', 'amount', 'description', 'category'],
+}
+
+
+def file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in ('.csv', '.jsonl'):
+        raise ValueError(f"Unsupported file type: {extension}")
+    return extension[1:]
+
+
+def read_rows(path):
+    # Yields (line number, row) one at a time so large files are never held in memory. JSONL rows are yielded as
+    # text and decoded by parse_record, so a malformed line is reported like any other bad row.
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        if file_format(path) == 'csv':
+            for line, row in enumerate(csv.DictReader(f), 2):
+                yield line, row
+        else:
+            for line, text in enumerate(f, 1):
+                if text.strip():
+                    yield line, text
+
+
+def parse_record(kind, row, category_ids):
+    if isinstance(row, str):
+        row = json.loads(row)
+    amount = float(row['amount'])
+    # nan/inf would poison the rollups for good, and the form never takes a negative amount either.
+    if not math.isfinite(amount) or amount < 0:
+        raise ValueError(f"Invalid amount: {row['amount']}")
+    record = {
+        'amount': round(amount, 2),
+        'description': row.get('description') or '',
+        'date': date.fromisoformat(str(row['date'])[:10]).isoformat(),
+    }
+    if kind == 'expenses':
+        if row.get('category') not in category_ids:
+            raise ValueError(f"Unknown category: {row.get('category')}")
+        record['category_id'] = category_ids[row['category']]
+    return record
+
+
+def write_rows(path, kind, records):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if file_format(path) == 'csv':
+            writer = csv.DictWriter(f, FIELDS[kind], extrasaction='ignore')
+            writer.writeheader()
+            for record in records:
+                writer.writerow(record)
+                count += 1
+        else:
+            for record in records:
+                f.write(json.dumps({field: record[field] for field in FIELDS[kind]}) + '\n')
+                count += 1
+    return count
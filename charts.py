@@ -0,0 +1,59 @@
+import io
+import threading
+from collections import OrderedDict
+
+from matplotlib.figure import Figure
+
+
+def _to_png(fig):
+    # Figures built with the OO API are not tracked by pyplot, so clearing them releases everything.
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format='png')
+    finally:
+        fig.clear()
+    return buffer.getvalue()
+
+
+def render_line(dates, expense_amounts, income_amounts, period):
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(dates, expense_amounts, marker='o', label='Chi tieu')
+    ax.plot(dates, income_amounts, marker='o', label='Thu nhap')
+    ax.set_xlabel(f'Thoi gian ({period})')
+    ax.set_ylabel('So tien (VND)')
+    ax.set_title(f'Thong ke chi tieu và thu nhap theo {period.capitalize()}')
+    ax.legend()
+    ax.grid(True)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def render_pie(category_summary, period):
+    fig = Figure(figsize=(7, 7))
+    ax = fig.subplots()
+    ax.pie(category_summary.values(), labels=category_summary.keys(), autopct='%1.1f%%', startangle=140)
+    ax.axis('equal')
+    ax.set_title(f'Thong ke chi tieu theo danh muc ({period.capitalize()})')
+    return _to_png(fig)
+
+
+class ChartCache:
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, render):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        png = render()
+        with self.lock:
+            self.entries[key] = png
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return png
@@ -0,0 +1,308 @@
+import numpy as np
+
+PERIOD_UNITS = {'Ngay': 'D', 'Thang': 'M', 'Nam': 'Y'}
+
+
+def to_day(date):
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+def to_days(dates):
+    return np.array(dates, dtype='datetime64[D]').astype(np.int32)
+
+
+def to_months(days):
+    return np.asarray(days).astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+
+
+def from_day(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+def to_amount(value):
+    # Amounts are stored to the cent; whole amounts stay ints so the JSON snapshot round-trips unchanged.
+    value = round(float(value), 2)
+    return int(value) if value.is_integer() else value
+
+
+class CategoryTable:
+    def __init__(self, categories=(), next_id=1):
+        self.by_id = {}
+        self.ids = {}
+        self.next_id = next_id
+        for category in categories:
+            self.add(category['name'], category.get('description', ''), category.get('id'))
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def add(self, name, description, category_id=None):
+        if category_id is None:
+            category_id = self.next_id
+        self.next_id = max(self.next_id, category_id + 1)
+        self.by_id[category_id] = {'id': category_id, 'name': name, 'description': description}
+        self.ids[name] = category_id
+        return category_id
+
+    def id_of(self, name):
+        # Older files store the name on each expense; unknown names become categories of their own.
+        if name not in self.ids:
+            self.add(name, '')
+        return self.ids[name]
+
+    def name(self, category_id):
+        return self.by_id[category_id]['name']
+
+    def update(self, category_id, name, description):
+        category = self.by_id[category_id]
+        del self.ids[category['name']]
+        category['name'] = name
+        category['description'] = description
+        self.ids[name] = category_id
+
+    def remove(self, category_id):
+        del self.ids[self.by_id.pop(category_id)['name']]
+
+    def to_list(self):
+        return [dict(category) for category in self.by_id.values()]
+
+
+class RecordColumns:
+    COLUMNS = (('id', np.int64), ('alive', bool), ('amount', np.float64),
+               ('day', np.int32), ('month', np.int32), ('cat', np.int32))
+
+    def __init__(self, categories, has_category, records=(), next_id=1):
+        self.categories = categories
+        self.has_category = has_category
+        # Category id -> ids of its live records, built on first use.
+        self.members = None
+        self.size = 0
+        self.live = 0
+        self.next_id = next_id
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        self.description = []
+        self.rows = {}
+        # Live rows sorted by (day, id), with their days alongside for searchsorted range lookups.
+        self.order = np.zeros(0, dtype=np.int32)
+        self.order_day = np.zeros(0, dtype=np.int32)
+        self.extend(records)
+
+    def __len__(self):
+        return self.live
+
+    def __contains__(self, record_id):
+        return record_id in self.rows
+
+    def _reserve(self, size):
+        if size <= len(self.amount):
+            return
+        capacity = max(size, 2 * len(self.amount), 16)
+        for name, dtype in self.COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def extend(self, records):
+        records = list(records)
+        start, end = self.size, self.size + len(records)
+        self._reserve(end)
+        for record in records:
+            # Records from older files carry no id; they are numbered in file order.
+            if record.get('id') is None:
+                record['id'] = self.next_id
+            self.next_id = max(self.next_id, record['id'] + 1)
+        self.id[start:end] = [record['id'] for record in records]
+        self.alive[start:end] = True
+        self.amount[start:end] = [record['amount'] for record in records]
+        self.day[start:end] = to_days([record['date'] for record in records])
+        self.month[start:end] = to_months(self.day[start:end])
+        if self.has_category:
+            self.cat[start:end] = [record['category_id'] if 'category_id' in record
+                                   else self.categories.id_of(record['category']) for record in records]
+            if self.members is not None:
+                for record_id, category_id in zip(self.id[start:end].tolist(), self.cat[start:end].tolist()):
+                    self.members.setdefault(category_id, set()).add(record_id)
+        else:
+            self.cat[start:end] = -1
+        self.description.extend(record.get('description', '') for record in records)
+        self.rows.update(zip(self.id[start:end].tolist(), range(start, end)))
+        self.size = end
+        self.live += len(records)
+        if len(records) > 64:
+            self._sort()
+        else:
+            for row in range(start, end):
+                self._insert_order(row)
+
+    def append(self, record):
+        self.extend([record])
+        return record['id']
+
+    def _sort(self):
+        rows = np.flatnonzero(self.alive[:self.size])
+        self.order = rows[np.lexsort((self.id[rows], self.day[rows]))].astype(np.int32)
+        self.order_day = self.day[self.order]
+
+    def _order_position(self, row):
+        day = self.day[row]
+        lo = np.searchsorted(self.order_day, day, 'left')
+        hi = np.searchsorted(self.order_day, day, 'right')
+        return lo + np.searchsorted(self.id[self.order[lo:hi]], self.id[row])
+
+    def _insert_order(self, row):
+        position = self._order_position(row)
+        self.order = np.insert(self.order, position, row)
+        self.order_day = np.insert(self.order_day, position, self.day[row])
+
+    def _remove_order(self, row):
+        position = self._order_position(row)
+        self.order = np.delete(self.order, position)
+        self.order_day = np.delete(self.order_day, position)
+
+    def id_at(self, index):
+        return int(self.id[np.flatnonzero(self.alive[:self.size])[index]])
+
+    def update(self, record_id, record):
+        row = self.rows[record_id]
+        if 'amount' in record:
+            self.amount[row] = record['amount']
+        if 'date' in record and to_day(record['date']) != self.day[row]:
+            self._remove_order(row)
+            self.day[row] = to_day(record['date'])
+            self.month[row] = to_months(self.day[row])
+            self._insert_order(row)
+        if 'category_id' in record and self.has_category:
+            if self.members is not None:
+                self.members[int(self.cat[row])].discard(record_id)
+                self.members.setdefault(record['category_id'], set()).add(record_id)
+            self.cat[row] = record['category_id']
+        if 'description' in record:
+            self.description[row] = record['description']
+
+    def delete(self, record_id):
+        # Tombstone the row; slots are reclaimed in bulk once half of them are dead.
+        row = self.rows.pop(record_id)
+        if self.has_category and self.members is not None:
+            self.members[int(self.cat[row])].discard(record_id)
+        self._remove_order(row)
+        self.alive[row] = False
+        self.description[row] = None
+        self.live -= 1
+        self._maybe_compact()
+
+    def delete_many(self, record_ids):
+        rows = np.array([self.rows.pop(record_id) for record_id in record_ids], dtype=np.int64)
+        if self.has_category and self.members is not None:
+            for record_id, code in zip(record_ids, self.cat[rows].tolist()):
+                self.members[code].discard(record_id)
+        self.alive[rows] = False
+        for row in rows.tolist():
+            self.description[row] = None
+        self.live -= len(rows)
+        keep = self.alive[self.order]
+        self.order, self.order_day = self.order[keep], self.order_day[keep]
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self.size > 64 and 2 * self.live < self.size:
+            self.keep(self.alive[:self.size])
+
+    def keep(self, mask):
+        rows = np.flatnonzero(mask[:self.size] & self.alive[:self.size])
+        if len(rows) != self.live:
+            self.members = None
+        for name, _ in self.COLUMNS:
+            column = getattr(self, name)
+            column[:len(rows)] = column[rows]
+        self.description = [self.description[row] for row in rows]
+        self.size = self.live = len(rows)
+        self.rows = dict(zip(self.id[:self.size].tolist(), range(self.size)))
+        self._sort()
+
+    def member_ids(self, category_id):
+        if self.members is None:
+            self.members = {}
+            rows = np.flatnonzero(self.alive[:self.size])
+            for record_id, code in zip(self.id[rows].tolist(), self.cat[rows].tolist()):
+                self.members.setdefault(code, set()).add(record_id)
+        return self.members.get(category_id, set())
+
+    def record(self, row, names=True):
+        record = {
+            'id': int(self.id[row]),
+            'amount': to_amount(self.amount[row]),
+            'description': self.description[row],
+        }
+        if self.has_category:
+            record['category_id'] = int(self.cat[row])
+            if names:
+                record['category'] = self.categories.name(record['category_id'])
+        record['date'] = from_day(self.day[row])
+        return record
+
+    def to_records(self, rows=None, names=True):
+        if rows is None:
+            rows = np.flatnonzero(self.alive[:self.size])
+        return [self.record(row, names) for row in rows]
+
+    def mask(self, start=None, end=None):
+        mask = self.alive[:self.size].copy()
+        day = self.day[:self.size]
+        if start is not None:
+            mask &= day >= to_day(start)
+        if end is not None:
+            mask &= day <= to_day(end)
+        return mask
+
+    def range_rows(self, start=None, end=None):
+        lo = 0 if start is None else np.searchsorted(self.order_day, to_day(start), 'left')
+        hi = len(self.order) if end is None else np.searchsorted(self.order_day, to_day(end), 'right')
+        return self.order[lo:hi]
+
+    def select(self, start=None, end=None, search=None, sort='date', descending=False):
+        rows = self.range_rows(start, end)
+        if search:
+            needle = search.lower()
+            rows = rows[np.fromiter((needle in (self.description[row] or '').lower() for row in rows.tolist()),
+                                    dtype=bool, count=len(rows))]
+        if sort == 'amount':
+            rows = rows[np.argsort(self.amount[rows], kind='stable')]
+        return rows[::-1] if descending else rows
+
+    def keys(self, period):
+        # Day and month keys are stored columns, so grouping never re-parses dates.
+        unit = PERIOD_UNITS[period]
+        if unit == 'D':
+            return self.day[:self.size], unit
+        elif unit == 'M':
+            return self.month[:self.size], unit
+        return self.month[:self.size] // 12, unit
+
+    def group_totals(self, period, mask):
+        keys, unit = self.keys(period)
+        keys = keys[mask]
+        if not len(keys):
+            return {}
+        base = int(keys.min())
+        totals = np.bincount(keys - base, weights=self.amount[:self.size][mask])
+        counts = np.bincount(keys - base)
+        buckets = np.flatnonzero(counts)
+        labels = np.datetime_as_string((buckets + base).astype(f'datetime64[{unit}]'))
+        return {str(label): [float(total), int(count)]
+                for label, total, count in zip(labels, totals[buckets], counts[buckets])}
+
+    def group_sums(self, period, mask):
+        return {label: to_amount(total) for label, (total, _) in self.group_totals(period, mask).items()}
+
+    def category_sums(self, mask):
+        cat = self.cat[:self.size][mask]
+        if not len(cat):
+            return {}
+        totals = np.bincount(cat, weights=self.amount[:self.size][mask])
+        counts = np.bincount(cat)
+        return {int(code): to_amount(totals[code]) for code in np.flatnonzero(counts)}
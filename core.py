@@ -0,0 +1,242 @@
+from bulk import parse_record, read_rows, write_rows
+from charts import ChartCache, render_line, render_pie
+from columns import to_amount
+import profiling
+from storage import ConflictError, open_backend, period_range
+
+
+class LedgerError(Exception):
+    pass
+
+
+class Ledger:
+    # Queries, aggregation and writes with no UI attached; errors are raised as LedgerError with a user-facing message.
+    # read_only opens the ledger without migrating, compacting or creating any file; writes raise LedgerError.
+    def __init__(self, file_name='expenses.json', journal=False, compact_threshold=1000, backend=None, read_only=False):
+        self.file_name = file_name
+        self.backend = backend or self.open_data(journal, compact_threshold, read_only)
+        self.charts = ChartCache()
+
+    @property
+    def version(self):
+        return self.backend.version
+
+    @profiling.profiled
+    def refresh(self):
+        return self.backend.refresh()
+
+    @profiling.profiled
+    def open_data(self, journal, compact_threshold, read_only):
+        # Backends load (and migrate) in their constructor, so the cold load is profiled here rather than in load_data.
+        return open_backend(self.file_name, journal=journal, compact_threshold=compact_threshold, read_only=read_only)
+
+    @profiling.profiled
+    def load_data(self):
+        return self.backend.load()
+
+    @profiling.profiled
+    def save_data(self):
+        self.backend.save()
+
+    def categories(self):
+        return self.backend.categories()
+
+    def category_names(self):
+        return [cat['name'] for cat in self.backend.categories()]
+
+    def records(self, kind):
+        return self.backend.records(kind)
+
+    def periods(self, kind):
+        return [f"{year}-{month}" for year in reversed(self.backend.years(kind))
+                for month in reversed(self.backend.months(kind, year))]
+
+    def apply(self, op):
+        if self.backend.read_only:
+            raise LedgerError("So chi tieu dang mo o che do chi doc.")
+        # Another session or process may have changed the same data since this one last refreshed.
+        try:
+            self.backend.apply(op)
+        except ConflictError as e:
+            raise LedgerError(f"Du lieu vua bi thay doi o noi khac, vui long thu lai. ({e})") from e
+
+    @profiling.profiled
+    def add_income(self, amount, description, date):
+        record = {
+            'amount': round(amount, 2),
+            'description': description,
+            'date': date.strftime('%Y-%m-%d')
+        }
+        self.apply({'op': 'add', 'kind': 'income', 'record': record})
+        return record['id']
+
+    @profiling.profiled
+    def update_income(self, record_id, amount, description, date):
+        if self.backend.has_record('income', record_id):
+            self.apply({'op': 'update', 'kind': 'income', 'id': record_id, 'record': {
+                'amount': round(amount, 2),
+                'description': description,
+                'date': date.strftime('%Y-%m-%d')
+            }})
+        else:
+            raise LedgerError("Chi muc khong hop le")
+
+    @profiling.profiled
+    def delete_income(self, record_id):
+        if self.backend.has_record('income', record_id):
+            self.apply({'op': 'delete', 'kind': 'income', 'id': record_id})
+        else:
+            raise LedgerError("Chi muc khong hop le")
+
+    @profiling.profiled
+    def add_category(self, category_name, description):
+        if not self.backend.has_category(category_name):
+            op = {'op': 'add_category', 'name': category_name, 'description': description}
+            self.apply(op)
+            return op['id']
+
+    @profiling.profiled
+    def update_category(self, old_category_name, new_category_name, new_description):
+        category_id = self.backend.category_id(old_category_name)
+        if new_category_name != old_category_name and self.backend.has_category(new_category_name):
+            raise LedgerError("Danh muc da ton tai!")
+        elif category_id is not None:
+            self.apply({'op': 'update_category', 'id': category_id,
+                        'name': new_category_name, 'description': new_description})
+        else:
+            raise LedgerError("Danh muc khong ton tai!")
+
+    @profiling.profiled
+    def delete_category(self, category_name):
+        category_id = self.backend.category_id(category_name)
+        if category_id is not None:
+            self.apply({'op': 'delete_category', 'id': category_id})
+
+    @profiling.profiled
+    def add_expense(self, amount, description, category, date):
+        category_id = self.backend.category_id(category)
+        if category_id is None:
+            raise LedgerError("Danh muc khong ton tai!")
+        record = {
+            'amount': round(amount, 2),
+            'description': description,
+            'category_id': category_id,
+            'date': date.strftime('%Y-%m-%d')
+        }
+        self.apply({'op': 'add', 'kind': 'expenses', 'record': record})
+        return record['id']
+
+    @profiling.profiled
+    def update_expense(self, record_id, amount, description, category, date):
+        category_id = self.backend.category_id(category)
+        if not self.backend.has_record('expenses', record_id):
+            raise LedgerError("Chi muc khong hop le")
+        elif category_id is None:
+            raise LedgerError("Danh muc khong ton tai!")
+        else:
+            self.apply({'op': 'update', 'kind': 'expenses', 'id': record_id, 'record': {
+                'amount': round(amount, 2),
+                'description': description,
+                'category_id': category_id,
+                'date': date.strftime('%Y-%m-%d')
+            }})
+
+    @profiling.profiled
+    def delete_expense(self, record_id):
+        if self.backend.has_record('expenses', record_id):
+            self.apply({'op': 'delete', 'kind': 'expenses', 'id': record_id})
+        else:
+            raise LedgerError("Chi muc khong hop le")
+
+    @profiling.profiled
+    def page(self, kind, start=None, end=None, search=None, sort='date', descending=False, offset=0, limit=50):
+        return self.backend.page(kind, start, end, search, sort, descending, offset, limit)
+
+    @profiling.profiled
+    def import_records(self, kind, source, batch_size=None):
+        # source is a .csv/.jsonl path or an iterable of dicts. Valid rows are committed in one write at the end;
+        # pass batch_size to commit every batch_size rows instead, bounding memory at the cost of partial imports.
+        rows = read_rows(source) if isinstance(source, str) else enumerate(source, 1)
+        category_ids = {cat['name']: cat['id'] for cat in self.backend.categories()}
+        batch, imported, errors = [], 0, []
+        for line, row in rows:
+            try:
+                batch.append(parse_record(kind, row, category_ids))
+            except KeyError as e:
+                errors.append((line, f"Missing field: {e}"))
+                continue
+            except (TypeError, ValueError) as e:
+                errors.append((line, str(e)))
+                continue
+            if batch_size and len(batch) >= batch_size:
+                self.apply({'op': 'add_many', 'kind': kind, 'records': batch})
+                imported, batch = imported + len(batch), []
+        if batch:
+            self.apply({'op': 'add_many', 'kind': kind, 'records': batch})
+            imported += len(batch)
+        return imported, errors
+
+    @profiling.profiled
+    def export_records(self, kind, destination, start=None, end=None):
+        with self.backend.lock:
+            return write_rows(destination, kind, self.backend.iter_records(kind, start, end))
+
+    @profiling.profiled
+    def summarize_expenses(self, period, start=None, end=None):
+        return self.backend.summarize('expenses', period, start, end)
+
+    @profiling.profiled
+    def summarize_income(self, period, start=None, end=None):
+        return self.backend.summarize('income', period, start, end)
+
+    @profiling.profiled
+    def line_chart(self, period, date_range):
+        start_period, end_period = date_range
+        start = end = None
+        if start_period and end_period:
+            start, end = period_range(period, start_period)[0], period_range(period, end_period)[1]
+
+        def render():
+            expense_summary = self.summarize_expenses(period, start, end)
+            income_summary = self.summarize_income(period, start, end)
+
+            sorted_expense_summary = sorted(expense_summary.items(), key=lambda x: x[0])
+
+            dates = [item[0] for item in sorted_expense_summary]
+            expense_amounts = [item[1] for item in sorted_expense_summary]
+            income_amounts = [income_summary.get(date, 0) for date in dates]
+            return render_line(dates, expense_amounts, income_amounts, period)
+
+        return self.charts.get(('line', period, start, end, self.version), render)
+
+    @profiling.profiled
+    def pie_chart(self, period, specific_period):
+        def render():
+            category_summary = self.backend.category_totals(*period_range(period, specific_period))
+            if any(category_summary.values()):
+                return render_pie(category_summary, period)
+
+        return self.charts.get(('pie', period, specific_period, self.version), render)
+
+    @profiling.profiled
+    def report(self, period, value):
+        # Everything a month ('Thang', 'YYYY-MM') or year ('Nam', 'YYYY') report shows, as plain data.
+        start, end = period_range(period, value)
+        step = 'Ngay' if period == 'Thang' else 'Thang'
+        expenses = self.summarize_expenses(step, start, end)
+        income = self.summarize_income(step, start, end)
+        total_expenses, total_income = to_amount(sum(expenses.values())), to_amount(sum(income.values()))
+        categories = self.backend.category_totals(start, end)
+        return {
+            'period': period,
+            'value': value,
+            'start': start,
+            'end': end,
+            'income': total_income,
+            'expenses': total_expenses,
+            'balance': to_amount(total_income - total_expenses),
+            'categories': dict(sorted(categories.items(), key=lambda item: item[1], reverse=True)),
+            'step': step,
+            'series': [{'key': key, 'income': income.get(key, 0), 'expenses': expenses.get(key, 0)}
+                       for key in sorted(set(expenses) | set(income))],
+        }
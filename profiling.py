@@ -0,0 +1,99 @@
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+FIELDS = ('calls', 'seconds', 'records', 'bytes_read', 'bytes_written')
+
+logger = logging.getLogger('qlct.profile')
+logger.addHandler(logging.NullHandler())
+
+# Stats of the rerun (or script) running in this thread; None means instrumentation is off.
+_current = contextvars.ContextVar('qlct_profile', default=None)
+
+
+def enabled():
+    return os.environ.get('QLCT_PROFILE', '') not in ('', '0')
+
+
+def log_to_stderr():
+    if not any(isinstance(handler, logging.StreamHandler) for handler in logger.handlers):
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+class Stats:
+    def __init__(self):
+        self.methods = {}
+        # Counters of the calls currently on the stack; work is charged to each of them, like wall time.
+        self.active = []
+        self.seconds = 0
+        self.profile = None
+
+    def rows(self):
+        return sorted(({'method': name, **entry} for name, entry in self.methods.items()),
+                      key=lambda row: row['seconds'], reverse=True)
+
+
+def count(field, n):
+    stats = _current.get()
+    if stats is not None:
+        for call in stats.active:
+            call[field] += n
+
+
+def profiled(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return method(self, *args, **kwargs)
+        call = dict.fromkeys(FIELDS, 0)
+        stats.active.append(call)
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            call['calls'] = 1
+            call['seconds'] = time.perf_counter() - started
+            stats.active.pop()
+            entry = stats.methods.setdefault(method.__name__, dict.fromkeys(FIELDS, 0))
+            for field in FIELDS:
+                entry[field] += call[field]
+            logger.info(json.dumps({'event': 'call', 'method': method.__name__, **call}))
+    return wrapper
+
+
+@contextmanager
+def capture(profile=False):
+    stats = Stats()
+    token = _current.set(stats)
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) already owns this thread.
+            profiler = None
+    started = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.seconds = time.perf_counter() - started
+        if profiler:
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(30)
+            stats.profile = output.getvalue()
+        _current.reset(token)
+        logger.info(json.dumps({'event': 'rerun', 'seconds': stats.seconds,
+                                'methods': {name: entry for name, entry in stats.methods.items()}}))
@@ -1,273 +1,170 @@
-import json
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
 import streamlit as st
 import calendar
+import functools
+import math
 import pandas as pd
-
-class ExpenseManager:
-    def __init__(self, file_name='expenses.json'):
-        self.file_name = file_name
-        self.data = self.load_data()
-
-    def load_data(self):
+from core import Ledger, LedgerError
+import profiling
+from storage import period_range
+
+SORT_OPTIONS = {
+    "Ngay cu nhat": ('date', False),
+    "Ngay moi nhat": ('date', True),
+    "So tien lon nhat": ('amount', True),
+    "So tien nho nhat": ('amount', False),
+}
+
+def shows_errors(method):
+    # The core raises LedgerError; in the app it becomes an error message, the action is skipped and False is returned,
+    # so callers only report success for committed writes. (A sentinel object would not survive Streamlit reruns,
+    # which re-execute this module while the cached manager keeps the old one.)
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
         try:
-            with open(self.file_name, 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {'income': [], 'expenses': [], 'categories': []}
-
-    def save_data(self):
-        with open(self.file_name, 'w') as f:
-            json.dump(self.data, f, indent=4)
-
-    def add_income(self, amount, description, date):
-        self.data['income'].append({
-            'amount': round(amount, 2),
-            'description': description,
-            'date': date.strftime('%Y-%m-%d')
-        })
-        self.save_data()
-
-    def update_income(self, index, amount, description, date):
-        if 0 <= index < len(self.data['income']):
-            self.data['income'][index].update({
-                'amount': round(amount, 2),
-                'description': description,
-                'date': date.strftime('%Y-%m-%d')
-            })
-            self.save_data()
-        else:
-            st.error("Chi muc khong hop le")
-
-    def delete_income(self, index):
-        if 0 <= index < len(self.data['income']):
-            del self.data['income'][index]
-            self.save_data()
-        else:
-            st.error("Chi muc khong hop le")
-
-    def add_category(self, category_name, description):
-        if category_name not in [cat['name'] for cat in self.data['categories'] if isinstance(cat, dict)]:
-            self.data['categories'].append({'name': category_name, 'description': description})
-            self.save_data()
-
-    def update_category(self, old_category_name, new_category_name, new_description):
-        for category in self.data['categories']:
-            if category['name'] == old_category_name:
-                category['name'] = new_category_name
-                category['description'] = new_description
-                for expense in self.data['expenses']:
-                    if expense['category'] == old_category_name:
-                        expense['category'] = new_category_name
-                self.save_data()
-                return
-        st.error("Danh muc khong ton tai!")
-
-    def delete_category(self, category_name):
-        self.data['categories'] = [cat for cat in self.data['categories'] if cat['name'] != category_name]
-        self.data['expenses'] = [expense for expense in self.data['expenses'] if expense['category'] != category_name]
-        self.save_data()
-
-    def add_expense(self, amount, description, category, date):
-        if category not in [cat['name'] for cat in self.data['categories'] if isinstance(cat, dict)]:
-            st.error("Danh muc khong ton tai!")
-            return
-        self.data['expenses'].append({
-            'amount': round(amount, 2),
-            'description': description,
-            'category': category,
-            'date': date.strftime('%Y-%m-%d')
-        })
-        self.save_data()
-
-    def update_expense(self, index, amount, description, category, date):
-        if 0 <= index < len(self.data['expenses']):
-            self.data['expenses'][index].update({
-                'amount': round(amount, 2),
-                'description': description,
-                'category': category,
-                'date': date.strftime('%Y-%m-%d')
-            })
-            self.save_data()
-        else:
-            st.error("Chi muc khong hop le")
-
-    def delete_expense(self, index):
-        if 0 <= index < len(self.data['expenses']):
-            del self.data['expenses'][index]
-            self.save_data()
-        else:
-            st.error("Chi muc khong hop le")
-
+            return method(self, *args, **kwargs)
+        except LedgerError as e:
+            st.error(str(e))
+            return False
+    return wrapper
+
+class ExpenseManager(Ledger):
+    add_income = shows_errors(Ledger.add_income)
+    update_income = shows_errors(Ledger.update_income)
+    delete_income = shows_errors(Ledger.delete_income)
+    add_category = shows_errors(Ledger.add_category)
+    update_category = shows_errors(Ledger.update_category)
+    delete_category = shows_errors(Ledger.delete_category)
+    add_expense = shows_errors(Ledger.add_expense)
+    update_expense = shows_errors(Ledger.update_expense)
+    delete_expense = shows_errors(Ledger.delete_expense)
+
+    @profiling.profiled
+    def show_records(self, kind, start, end, columns, row):
+        # Only the visible page is fetched and rendered; the pager needs just the total count.
+        search = st.text_input("Tim kiem ghi chu:", key=f"{kind}_search")
+        sort = st.selectbox("Sap xep:", list(SORT_OPTIONS), key=f"{kind}_sort")
+        page_size = st.selectbox("So dong moi trang:", [20, 50, 100], key=f"{kind}_page_size")
+        page_key = f"{kind}_page"
+        page_number = st.session_state.get(page_key, 1)
+        sort_column, descending = SORT_OPTIONS[sort]
+        records, total = self.page(kind, start, end, search, sort_column, descending,
+                                   (page_number - 1) * page_size, page_size)
+        pages = max(1, math.ceil(total / page_size))
+        if page_number > pages:
+            page_number = st.session_state[page_key] = pages
+            records, total = self.page(kind, start, end, search, sort_column, descending,
+                                       (page_number - 1) * page_size, page_size)
+        if records:
+            st.table(pd.DataFrame([row(record) for record in records], columns=columns))
+            st.number_input(f"Trang (tren {pages}):", min_value=1, max_value=pages, step=1, key=page_key)
+            st.caption(f"{total} dong")
+        return total
+
+    def show_expenses(self, start=None, end=None):
+        return self.show_records('expenses', start, end, ['Ghi chu', 'So tien (VND)', 'Danh muc', 'Ngay'],
+                                 lambda expense: [expense['description'], expense['amount'], expense['category'], expense['date']])
+
+    def show_income(self, start=None, end=None):
+        return self.show_records('income', start, end, ['Loai thu nhap', 'So tien (VND)', 'Ngay'],
+                                 lambda income: [income['description'], income['amount'], income['date']])
+
+    @profiling.profiled
     def list_expenses(self, period=None):
         if period == 'Toan bo':
-            table_data = []
-            sorted_expenses = sorted(self.data['expenses'], key=lambda x: x['date'])  
-            for idx, expense in enumerate(sorted_expenses):
-                table_data.append([expense['description'], expense['amount'], expense['category'], expense['date']])
-            st.table(pd.DataFrame(table_data, columns=['Ghi chu', 'So tien (VND)', 'Danh muc', 'Ngay']))
+            if not self.show_expenses():
+                st.write("Khong tim thay thong tin chi tieu.")
 
         elif period == 'Ngay':
             selected_date = st.date_input("Ngay:")
-            expenses_by_day = [expense for expense in self.data['expenses'] if expense['date'] == selected_date.strftime('%Y-%m-%d')]
-            if expenses_by_day:
-                table_data = []
-                for idx, expense in enumerate(expenses_by_day):
-                    table_data.append([expense['description'], expense['amount'], expense['category'], expense['date']])
-                st.table(pd.DataFrame(table_data, columns=['Ghi chu', 'So tien (VND)', 'Danh muc', 'Ngay']))
-            else:
+            if not self.show_expenses(*period_range('Ngay', selected_date.strftime('%Y-%m-%d'))):
                 st.write("Khong tim thay thong tin chi tieu trong ngay duoc chon.")
         
         elif period == 'Thang':
-            selected_year = st.selectbox("Nam:", list(set(expense['date'][:4] for expense in self.data['expenses'])))
-            expenses_by_year = [expense for expense in self.data['expenses'] if expense['date'][:4] == selected_year]
-            selected_month = st.selectbox("Thang:", [str(i).zfill(2) for i in range(1, 13)])
-            expenses_by_month = [expense for expense in expenses_by_year if expense['date'][5:7] == selected_month]
-            sorted_expenses_by_month = sorted(expenses_by_month, key=lambda x: x['date'])  
-            if sorted_expenses_by_month:
-                table_data = []
-                for idx, expense in enumerate(sorted_expenses_by_month):
-                    table_data.append([expense['description'], expense['amount'], expense['category'], expense['date']])
-                st.table(pd.DataFrame(table_data, columns=['Ghi chu', 'So tien (VND)', 'Danh muc', 'Ngay']))
-            else:
+            selected_year = st.selectbox("Nam:", self.backend.years('expenses'))
+            selected_month = st.selectbox("Thang:", self.backend.months('expenses', selected_year) if selected_year else [])
+            if not selected_month or not self.show_expenses(*period_range('Thang', f"{selected_year}-{selected_month}")):
                 st.write("Khong tim thay thong tin chi tieu trong thang duoc chon.")
 
         elif period == 'Nam':
-            selected_year = st.selectbox("Nam:", list(set(expense['date'][:4] for expense in self.data['expenses'])))
-            expenses_by_year = [expense for expense in self.data['expenses'] if expense['date'][:4] == selected_year]
-            sorted_expenses_by_year = sorted(expenses_by_year, key=lambda x: x['date'])  
-            if sorted_expenses_by_year:
-                table_data = []
-                for idx, expense in enumerate(sorted_expenses_by_year):
-                    table_data.append([expense['description'], expense['amount'], expense['category'], expense['date']])
-                st.table(pd.DataFrame(table_data, columns=['Ghi chu', 'So tien (VND)', 'Danh muc', 'Ngay']))
-            else:
+            selected_year = st.selectbox("Nam:", self.backend.years('expenses'))
+            if not selected_year or not self.show_expenses(*period_range('Nam', selected_year)):
                 st.write("Khong tim thay thong tin chi tieu trong nam duoc chon.")
 
         else:
             st.error("Giai doan duoc chon khong hop le.")
 
+    @profiling.profiled
     def list_income(self, period=None):
         if period == 'Toan bo':
-            table_data = []
-            sorted_income = sorted(self.data['income'], key=lambda x: x['date'])  
-            for idx, income in enumerate(sorted_income):
-                table_data.append([income['description'], income['amount'], income['date']])
-            st.table(pd.DataFrame(table_data, columns=['Loai thu nhap', 'So tien (VND)', 'Ngay']))
+            if not self.show_income():
+                st.write("Khong tim thay thong tin thu nhap.")
         
         elif period == 'Thang':
-            selected_year = st.selectbox("Nam:", list(set(income['date'][:4] for income in self.data['income'])))
-            incomes_by_year = [income for income in self.data['income'] if income['date'][:4] == selected_year]
-            selected_month = st.selectbox("Thang:", [str(i).zfill(2) for i in range(1, 13)])
-            incomes_by_month = [income for income in incomes_by_year if income['date'][5:7] == selected_month]
-            sorted_incomes_by_month = sorted(incomes_by_month, key=lambda x: x['date'])  
-            if sorted_incomes_by_month:
-                table_data = []
-                for idx, income in enumerate(sorted_incomes_by_month):
-                    table_data.append([income['description'], income['amount'], income['date']])
-                st.table(pd.DataFrame(table_data, columns=['Loai thu nhap', 'So tien (VND)', 'Ngay']))
-            else:
+            selected_year = st.selectbox("Nam:", self.backend.years('income'))
+            selected_month = st.selectbox("Thang:", self.backend.months('income', selected_year) if selected_year else [])
+            if not selected_month or not self.show_income(*period_range('Thang', f"{selected_year}-{selected_month}")):
                 st.write("Khong tim thay thong tin thu nhap trong thang duoc chon.")
 
         elif period == 'Nam':
-            selected_year = st.selectbox("Nam:", list(set(income['date'][:4] for income in self.data['income'])))
-            incomes_by_year = [income for income in self.data['income'] if income['date'][:4] == selected_year]
-            sorted_incomes_by_year = sorted(incomes_by_year, key=lambda x: x['date'])  
-            if sorted_incomes_by_year:
-                table_data = []
-                for idx, income in enumerate(sorted_incomes_by_year):
-                    table_data.append([income['description'], income['amount'], income['date']])
-                st.table(pd.DataFrame(table_data, columns=['Loai thu nhap', 'So tien (VND)', 'Ngay']))
-            else:
+            selected_year = st.selectbox("Nam:", self.backend.years('income'))
+            if not selected_year or not self.show_income(*period_range('Nam', selected_year)):
                 st.write("Khong tim thay thong tin thu nhap trong nam duoc chon.")
 
         else:
             st.error("Giai doan duoc chon khong hop le.")
 
-    def summarize_expenses(self, period):
-        summary = {}
-        for expense in self.data['expenses']:
-            date = datetime.strptime(expense['date'], '%Y-%m-%d')
-            if period == 'Ngay':
-                key = date.strftime('%Y-%m-%d')
-            elif period == 'Thang':
-                key = date.strftime('%Y-%m')
-
-            if key not in summary:
-                summary[key] = 0
-            summary[key] += expense['amount']
-        
-        return summary
-
-    def summarize_income(self, period):
-        summary = {}
-        for income in self.data['income']:
-            date = datetime.strptime(income['date'], '%Y-%m-%d')
-            if period == 'Ngay':
-                key = date.strftime('%Y-%m-%d')
-            elif period == 'Thang':
-                key = date.strftime('%Y-%m')
-
-            if key not in summary:
-                summary[key] = 0
-            summary[key] += income['amount']
-        
-        return summary
-
+    @profiling.profiled
     def plot_line_summary(self, period, date_range):
-        start_period, end_period = date_range
-        expense_summary = self.summarize_expenses(period)
-        income_summary = self.summarize_income(period)
-
-        if start_period and end_period:
-            expense_summary = {k: v for k, v in expense_summary.items() if start_period <= k <= end_period}
-            income_summary = {k: v for k, v in income_summary.items() if start_period <= k <= end_period}
-
-        sorted_expense_summary = sorted(expense_summary.items(), key=lambda x: x[0])
-        sorted_income_summary = sorted(income_summary.items(), key=lambda x: x[0])
-
-        dates = [item[0] for item in sorted_expense_summary]
-        expense_amounts = [item[1] for item in sorted_expense_summary]
-        income_amounts = [income_summary.get(date, 0) for date in dates]
-
-        plt.figure(figsize=(10, 5))
-        plt.plot(dates, expense_amounts, marker='o', label='Chi tieu')
-        plt.plot(dates, income_amounts, marker='o', label='Thu nhap')
-        plt.xlabel(f'Thoi gian ({period})')
-        plt.ylabel('So tien (VND)')
-        plt.title(f'Thong ke chi tieu và thu nhap theo {period.capitalize()}')
-        plt.legend()
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        st.pyplot(plt)
-
+        st.image(self.line_chart(period, date_range))
 
+    @profiling.profiled
     def plot_pie_summary(self, period, specific_period):
-        category_summary = {}
-        for expense in self.data['expenses']:
-            date = datetime.strptime(expense['date'], '%Y-%m-%d')
-            if period == 'Ngay' and specific_period == date.strftime('%Y-%m-%d'):
-                key = expense['category']
-            elif period == 'Thang' and specific_period == date.strftime('%Y-%m'):
-                key = expense['category']
-            else:
-                continue
-
-            if key not in category_summary:
-                category_summary[key] = 0
-            category_summary[key] += expense['amount']
-
-        if category_summary:
-            plt.figure(figsize=(7, 7))
-            plt.pie(category_summary.values(), labels=category_summary.keys(), autopct='%1.1f%%', startangle=140)
-            plt.axis('equal')
-            plt.title(f'Thong ke chi tieu theo danh muc ({period.capitalize()})')
-            st.pyplot(plt)
+        png = self.pie_chart(period, specific_period)
+        if png:
+            st.image(png)
+
+def format_income(inc):
+    return f"#{inc['id']}. {inc['description']} - {inc['amount']} VND - {inc['date']}"
+
+def format_expense(exp):
+    return f"#{exp['id']}. {exp['description']} - {exp['amount']} VND - {exp['category']} - {exp['date']}"
+
+def select_record(manager, kind, label, format_func):
+    # Pick a month first so only that month's records are labelled, then address the record by id.
+    period = st.selectbox("Thang:", manager.periods(kind))
+    records = manager.backend.query(kind, *period_range('Thang', period)) if period else []
+    labels = {record['id']: format_func(record) for record in records}
+    return st.selectbox(label, list(labels), format_func=labels.get)
+
+@st.cache_resource
+def get_manager(file_name='expenses.json'):
+    # One manager per process, shared by every session; refresh() picks up changes from other writers.
+    return ExpenseManager(file_name, journal=True)
+
+def show_profile(stats):
+    with st.sidebar.expander("Hieu nang"):
+        st.caption(f"Lan chay: {stats.seconds * 1000:.1f} ms")
+        if stats.methods:
+            table = pd.DataFrame(stats.rows()).set_index('method')
+            table['seconds'] = (table['seconds'] * 1000).round(2)
+            st.dataframe(table.rename(columns={'seconds': 'ms'}))
+        st.checkbox("cProfile cho lan chay tiep theo", key='cprofile')
+        if stats.profile:
+            st.code(stats.profile)
 
 def main():
-    manager = ExpenseManager()
+    # Set QLCT_PROFILE=1 to time every ExpenseManager call of each rerun and log it as JSON lines.
+    if not profiling.enabled():
+        return run()
+    profiling.log_to_stderr()
+    with profiling.capture(st.session_state.get('cprofile', False)) as stats:
+        run()
+    show_profile(stats)
+
+def run():
+    manager = get_manager()
+    manager.refresh()
     
     st.title("Quan li chi tieu")
 
@@ -284,27 +181,25 @@ def main():
             description = st.text_input("Loai thu nhap:")
             date = st.date_input("Ngay:")
             if st.button("Tao thu nhap"):
-                manager.add_income(amount, description, date)
-                st.success("Ban da tao thanh cong!")
+                if manager.add_income(amount, description, date) is not False:
+                    st.success("Ban da tao thanh cong!")
 
         elif sub_choice == "Cap nhat":
             st.subheader("Cap nhat thu nhap")
-            incomes = [f"{idx + 1}. {inc['description']} - {inc['amount']} VND - {inc['date']}" for idx, inc in enumerate(manager.data['income'])]
-            index = st.selectbox("Thu nhap ban muon thay doi:", range(len(incomes)), format_func=lambda x: incomes[x])
+            record_id = select_record(manager, 'income', "Thu nhap ban muon thay doi:", format_income)
             amount = st.number_input("So tien:", min_value=0.0, step=0.01)
             description = st.text_input("Loai thu nhap:")
             date = st.date_input("Ngay:")
             if st.button("Cap nhat thu nhap"):
-                manager.update_income(index, amount, description, date)
-                st.success("Ban da cap nhat thanh cong!")
+                if manager.update_income(record_id, amount, description, date) is not False:
+                    st.success("Ban da cap nhat thanh cong!")
 
         elif sub_choice == "Xoa":
             st.subheader("Xoa thu nhap")
-            incomes = [f"{idx + 1}. {inc['description']} - {inc['amount']} VND - {inc['date']}" for idx, inc in enumerate(manager.data['income'])]
-            index = st.selectbox("Thu nhap ban muon xoa:", range(len(incomes)), format_func=lambda x: incomes[x])
+            record_id = select_record(manager, 'income', "Thu nhap ban muon xoa:", format_income)
             if st.button("Xoa thu nhap"):
-                manager.delete_income(index)
-                st.success("Ban da xoa thanh cong!")
+                if manager.delete_income(record_id) is not False:
+                    st.success("Ban da xoa thanh cong!")
 
         elif sub_choice == "Xem danh sach thu nhap":
             st.subheader("Xem danh sach thu nhap")
@@ -320,28 +215,28 @@ def main():
             category = st.text_input("Ten danh muc:")
             description = st.text_input("Mo ta:")
             if st.button("Them danh muc"):
-                manager.add_category(category, description)
-                st.success("Ban da tao thanh cong!")
+                if manager.add_category(category, description) is not False:
+                    st.success("Ban da tao thanh cong!")
 
         elif sub_choice == "Cap nhat":
             st.subheader("Cap nhat danh muc")
-            if all(isinstance(cat, dict) and 'name' in cat for cat in manager.data['categories']):
-                old_category = st.selectbox("Danh muc ban muon thay doi:", [cat['name'] for cat in manager.data['categories']])
+            if all(isinstance(cat, dict) and 'name' in cat for cat in manager.categories()):
+                old_category = st.selectbox("Danh muc ban muon thay doi:", manager.category_names())
                 new_category = st.text_input("Ten danh muc moi:")
                 new_description = st.text_input("Mo ta cho danh muc moi:")
                 if st.button("Cap nhat danh muc"):
-                    manager.update_category(old_category, new_category, new_description)
-                    st.success("Ban da cap nhat thanh cong!")
+                    if manager.update_category(old_category, new_category, new_description) is not False:
+                        st.success("Ban da cap nhat thanh cong!")
             else:
                 st.error("Du lieu danh muc khong hop le.")
 
         elif sub_choice == "Xoa":
             st.subheader("Xoa danh muc")
-            if all(isinstance(cat, dict) and 'name' in cat for cat in manager.data['categories']):
-                category = st.selectbox("Chon danh muc de xoa:", [cat['name'] for cat in manager.data['categories']])
+            if all(isinstance(cat, dict) and 'name' in cat for cat in manager.categories()):
+                category = st.selectbox("Chon danh muc de xoa:", manager.category_names())
                 if st.button("Xoa danh muc"):
-                    manager.delete_category(category)
-                    st.success("Ban da xoa thanh cong!")
+                    if manager.delete_category(category) is not False:
+                        st.success("Ban da xoa thanh cong!")
             else:
                 st.error("Du lieu danh muc khong hop le.")
 
@@ -354,36 +249,34 @@ def main():
             amount = st.number_input("So tien:", min_value=0, step=1)
             description = st.text_input("Ghi chu:")
             date = st.date_input("Ngay:")
-            if all(isinstance(cat, dict) and 'name' in cat for cat in manager.data['categories']):
-                category = st.selectbox("Chon danh muc:", [cat['name'] for cat in manager.data['categories']])
+            if all(isinstance(cat, dict) and 'name' in cat for cat in manager.categories()):
+                category = st.selectbox("Chon danh muc:", manager.category_names())
                 if st.button("Tao chi tieu"):
-                    manager.add_expense(amount, description, category, date)
-                    st.success("Ban da tao thanh cong!")
+                    if manager.add_expense(amount, description, category, date) is not False:
+                        st.success("Ban da tao thanh cong!")
             else:
                 st.error("Du lieu danh muc khong hop le.")
 
         elif sub_choice == "Cap nhat":
             st.subheader("Cap nhat chi tieu")
-            expenses = [f"{idx + 1}. {exp['description']} - {exp['amount']} VND - {exp['category']} - {exp['date']}" for idx, exp in enumerate(manager.data['expenses'])]
-            index = st.selectbox("Chi tieu ban muon thay doi:", range(len(expenses)), format_func=lambda x: expenses[x])
+            record_id = select_record(manager, 'expenses', "Chi tieu ban muon thay doi:", format_expense)
             amount = st.number_input("So tien:", min_value=0.0, step=0.01)
             description = st.text_input("Ghi chu:")
             date = st.date_input("Ngay:")
-            if all(isinstance(cat, dict) and 'name' in cat for cat in manager.data['categories']):
-                category = st.selectbox("Danh muc:", [cat['name'] for cat in manager.data['categories']])
+            if all(isinstance(cat, dict) and 'name' in cat for cat in manager.categories()):
+                category = st.selectbox("Danh muc:", manager.category_names())
                 if st.button("Cap nhat chi tieu"):
-                    manager.update_expense(index, amount, description, category, date)
-                    st.success("Ban da cap nhat thanh cong!")
+                    if manager.update_expense(record_id, amount, description, category, date) is not False:
+                        st.success("Ban da cap nhat thanh cong!")
             else:
                 st.error("Du lieu danh muc khong hop le.")
 
         elif sub_choice == "Xoa":
             st.subheader("Xoa chi tieu")
-            expenses = [f"{idx + 1}. {exp['description']} - {exp['amount']} VND - {exp['category']} - {exp['date']}" for idx, exp in enumerate(manager.data['expenses'])]
-            index = st.selectbox("Chi tieu ban muon xoa:", range(len(expenses)), format_func=lambda x: expenses[x])
+            record_id = select_record(manager, 'expenses', "Chi tieu ban muon xoa:", format_expense)
             if st.button("Xoa chi tieu"):
-                manager.delete_expense(index)
-                st.success("Ban da xoa thanh cong!")
+                if manager.delete_expense(record_id) is not False:
+                    st.success("Ban da xoa thanh cong!")
 
     elif choice == "Thong ke":
         sub_menu = ["Danh sach chi tieu", "Thong ke thu nhap va chi tieu theo thoi gian", "Thong ke chi tieu theo danh muc"]
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from charts import render_line, render_pie
+from core import Ledger
+from rollups import month_keys
+
+# Ledgers opened by this worker process, reused for every period it is handed.
+_ledgers = {}
+
+
+def open_ledger(file_name):
+    # Reports only read: nothing in a user's ledger is migrated, compacted or created.
+    if file_name not in _ledgers:
+        _ledgers[file_name] = Ledger(file_name, read_only=True)
+    return _ledgers[file_name]
+
+
+def ledger_name(file_name):
+    # The extension is kept, so expenses.json and expenses.db get separate report directories.
+    return os.path.basename(os.path.normpath(file_name))
+
+
+def write_report(file_name, period, value, output):
+    report = open_ledger(file_name).report(period, value)
+    directory = os.path.join(output, ledger_name(file_name), value)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    series = report['series']
+    if series:
+        png = render_line([row['key'] for row in series], [row['expenses'] for row in series],
+                          [row['income'] for row in series], report['step'])
+        with open(os.path.join(directory, 'series.png'), 'wb') as f:
+            f.write(png)
+    if any(report['categories'].values()):
+        with open(os.path.join(directory, 'categories.png'), 'wb') as f:
+            f.write(render_pie(report['categories'], period))
+    return directory
+
+
+def periods(start, end, monthly=True, yearly=True):
+    months = list(month_keys(start, end)) if monthly else []
+    years = [str(year) for year in range(int(start[:4]), int(end[:4]) + 1)] if yearly else []
+    return [('Thang', month) for month in months] + [('Nam', year) for year in years]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write monthly and yearly reports (JSON and charts) for one or more ledgers.")
+    parser.add_argument('ledgers', nargs='+', help="ledger files (.json, .db) or partitioned ledger directories")
+    parser.add_argument('--start', required=True, help="first month, YYYY-MM")
+    parser.add_argument('--end', required=True, help="last month, YYYY-MM")
+    parser.add_argument('--output', default='reports')
+    parser.add_argument('--only', choices=['Thang', 'Nam'], help="write only monthly or only yearly reports")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    # Report directories are named after the ledger, so two different ledgers must not share a name.
+    ledgers = {}
+    for ledger in args.ledgers:
+        # A mistyped path would otherwise open as an empty ledger and write all-zero reports.
+        if not os.path.exists(ledger):
+            parser.error(f"{ledger} does not exist")
+        other = ledgers.setdefault(ledger_name(ledger), ledger)
+        if os.path.realpath(other) != os.path.realpath(ledger):
+            parser.error(f"{other} and {ledger} would both write to {os.path.join(args.output, ledger_name(ledger))}; "
+                         "rename one of them")
+
+    tasks = [(ledger, period, value) for ledger in ledgers.values()
+             for period, value in periods(args.start, args.end, args.only != 'Nam', args.only != 'Thang')]
+    failed = 0
+    # One period per task: each worker only reads the partitions and rollups that period needs.
+    with ProcessPoolExecutor(args.workers) as pool:
+        futures = {pool.submit(write_report, ledger, period, value, args.output): (ledger, value)
+                   for ledger, period, value in tasks}
+        for future in as_completed(futures):
+            ledger, value = futures[future]
+            try:
+                print(future.result())
+            except Exception as e:
+                failed += 1
+                print(f"{ledger} {value}: {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
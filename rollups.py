@@ -0,0 +1,131 @@
+from calendar import monthrange
+from datetime import date, timedelta
+
+import numpy as np
+
+from columns import to_amount
+
+KINDS = ('income', 'expenses')
+
+
+def month_keys(start_month, end_month):
+    year, month = int(start_month[:4]), int(start_month[5:7])
+    end_year, end_month = int(end_month[:4]), int(end_month[5:7])
+    while (year, month) <= (end_year, end_month):
+        yield f"{year:04d}-{month:02d}"
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+def month_aligned(start, end):
+    # Month buckets can answer a range only if it starts on the 1st and ends on a month end.
+    return ((start is None or start[8:] == '01')
+            and (end is None or int(end[8:]) == monthrange(int(end[:4]), int(end[5:7]))[1]))
+
+
+def day_keys(start, end):
+    day, last = date.fromisoformat(start), date.fromisoformat(end)
+    while day <= last:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+
+def _bump(buckets, key, amount, sign):
+    bucket = buckets.setdefault(key, [0, 0])
+    bucket[0] += sign * amount
+    bucket[1] += sign
+    if bucket[1] == 0:
+        del buckets[key]
+
+
+class Rollups:
+    # days=False keeps only month-level buckets, for callers that store day buckets elsewhere.
+    def __init__(self, data=None, days=True):
+        data = data or {}
+        self.days = days
+        self.day = {kind: data.get('day', {}).get(kind, {}) for kind in KINDS}
+        self.month = {kind: data.get('month', {}).get(kind, {}) for kind in KINDS}
+        self.category = data.get('category', {})
+
+    @classmethod
+    def build(cls, tables):
+        rollups = cls()
+        for kind in KINDS:
+            table = tables[kind]
+            mask = table.mask()
+            rollups.day[kind] = table.group_totals('Ngay', mask)
+            rollups.month[kind] = table.group_totals('Thang', mask)
+        expenses = tables['expenses']
+        cat, alive = expenses.cat[:expenses.size], expenses.mask()
+        for code in np.unique(cat[alive]):
+            rollups.category[str(code)] = expenses.group_totals('Thang', alive & (cat == code))
+        return rollups
+
+    def to_dict(self):
+        return {'day': self.day, 'month': self.month, 'category': self.category}
+
+    def count(self, kind):
+        return sum(bucket[1] for bucket in self.month[kind].values())
+
+    def total(self, kind):
+        return sum(bucket[0] for bucket in self.month[kind].values())
+
+    def years(self, kind):
+        return sorted(set(month[:4] for month in self.month[kind]))
+
+    def months(self, kind, year):
+        return sorted(month[5:] for month in self.month[kind] if month[:4] == year)
+
+    def add(self, kind, record, sign=1):
+        amount, day = record['amount'], record['date']
+        if self.days:
+            _bump(self.day[kind], day, amount, sign)
+        _bump(self.month[kind], day[:7], amount, sign)
+        if kind == 'expenses':
+            # Keyed by category id (as a JSON object key), so renames never touch the rollups.
+            category = str(record['category_id'])
+            _bump(self.category.setdefault(category, {}), day[:7], amount, sign)
+            if not self.category[category]:
+                del self.category[category]
+
+    def remove(self, kind, record):
+        self.add(kind, record, -1)
+
+    def _days(self, buckets, start, end):
+        if start is None or end is None or len(buckets) < (date.fromisoformat(end) - date.fromisoformat(start)).days:
+            return [(day, bucket) for day, bucket in buckets.items()
+                    if (start is None or day >= start) and (end is None or day <= end)]
+        return [(day, buckets[day]) for day in day_keys(start, end) if day in buckets]
+
+    def _months(self, buckets, start, end):
+        if start is None or end is None or len(buckets) < 12 * (int(end[:4]) - int(start[:4]) + 1):
+            return [(month, bucket) for month, bucket in buckets.items()
+                    if (start is None or month >= start[:7]) and (end is None or month <= end[:7])]
+        return [(month, buckets[month]) for month in month_keys(start[:7], end[:7]) if month in buckets]
+
+    def summarize(self, kind, period, start=None, end=None):
+        if period == 'Ngay':
+            buckets = self._days(self.day[kind], start, end)
+        elif not month_aligned(start, end):
+            return None
+        elif period == 'Thang':
+            buckets = self._months(self.month[kind], start, end)
+        else:
+            years = {}
+            for month, (total, count) in self._months(self.month[kind], start, end):
+                bucket = years.setdefault(month[:4], [0, 0])
+                bucket[0] += total
+                bucket[1] += count
+            buckets = years.items()
+        return {key: to_amount(total) for key, (total, _) in sorted(buckets)}
+
+    def category_totals(self, start=None, end=None):
+        if not month_aligned(start, end):
+            return None
+        summary = {}
+        for category, months in self.category.items():
+            buckets = self._months(months, start, end)
+            if buckets:
+                summary[int(category)] = to_amount(sum(total for _, (total, _) in buckets))
+        return summary
@@ -0,0 +1,1076 @@
+import functools
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+from calendar import monthrange
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+import profiling
+from columns import CategoryTable, RecordColumns, to_amount
+from rollups import KINDS, Rollups
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; msvcrt locks a byte range instead.
+    fcntl = None
+    import msvcrt
+
+
+class ConflictError(Exception):
+    pass
+
+
+def period_range(period, value):
+    # Dates are ISO strings, so a day/month/year is an inclusive range of valid dates.
+    if period == 'Ngay':
+        return value, value
+    elif period == 'Thang':
+        year, month = int(value[:4]), int(value[5:7])
+        return value + '-01', f"{value}-{monthrange(year, month)[1]:02d}"
+    elif period == 'Nam':
+        return value + '-01-01', value + '-12-31'
+    raise ValueError(f"Unknown period: {period}")
+
+
+def synchronized(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def file_signature(file_name):
+    try:
+        stat = os.stat(file_name)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileLock:
+    # Exclusive lock on a side file, shared by every process using the same ledger. Threads are serialized by the
+    # backend's RLock first, so a depth counter is enough to make it reentrant (flock would deadlock on itself).
+    # Readers pass create=False: they wait for writers that use the lock but never create the side file themselves.
+    def __init__(self, file_name, create=True):
+        self.file_name = file_name
+        self.create = create
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        if self.depth == 0 and (self.create or os.path.exists(self.file_name)):
+            self.file = open(self.file_name, 'a+')
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0 and self.file:
+            if fcntl:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.file.close()
+            self.file = None
+
+
+def check_op(backend, op):
+    # Runs under the write lock after catching up, so it sees every committed write, including other processes'.
+    categories = {cat['id']: cat['name'] for cat in backend.categories()}
+    if op['op'] in ('update', 'delete') and not backend.has_record(op['kind'], op['id']):
+        raise ConflictError(f"{op['kind']} #{op['id']} no longer exists")
+    records = op.get('records', [op['record']] if 'record' in op else [])
+    if any('category_id' in record and record['category_id'] not in categories for record in records):
+        raise ConflictError("category no longer exists")
+    if op['op'] in ('update_category', 'delete_category') and op['id'] not in categories:
+        raise ConflictError(f"category #{op['id']} no longer exists")
+    if op['op'] in ('add_category', 'update_category') and op['name'] in categories.values() \
+            and categories.get(op.get('id')) != op['name']:
+        raise ConflictError(f"category {op['name']} already exists")
+
+
+def write_json(file_name, data, indent=4):
+    # Written to a temporary file and renamed over the target, so readers never see a partial file.
+    os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+    tmp_name = file_name + '.tmp'
+    with open(tmp_name, 'w') as f:
+        json.dump(data, f, indent=indent)
+        size = f.tell()
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_name, file_name)
+    return size
+
+
+class JsonBackend:
+    # read_only replays the log and assigns ids in memory but never writes, compacts or creates files.
+    # An existing log is replayed whatever the journal flag: journal=False only means this instance snapshots on
+    # every write instead of appending, so writers in either mode can share a ledger.
+    def __init__(self, file_name='expenses.json', journal=False, compact_threshold=1000, read_only=False):
+        self.file_name = file_name
+        self.journal = journal
+        self.read_only = read_only
+        self.log_name = file_name + '.log'
+        self.compact_threshold = compact_threshold
+        self.log_entries = 0
+        # Bytes of the log already applied; other processes' appends are replayed from here.
+        self.log_offset = 0
+        self.version = 0
+        self.data_version = 0
+        self.lock = threading.RLock()
+        self.file_lock = FileLock(file_name + '.lock', create=not read_only)
+        self.load()
+
+    def signature(self):
+        return file_signature(self.file_name), file_signature(self.log_name)
+
+    @synchronized
+    def refresh(self):
+        # Cheap enough to run on every rerun: two stat calls unless another writer touched the files.
+        if self.signature() != self._signature:
+            with self.file_lock:
+                self._catch_up()
+        return self.version
+
+    def _catch_up(self):
+        # Appends by other processes are replayed from where we left off; only a new snapshot forces a reload.
+        snapshot, log = self.signature()
+        if snapshot != self._signature[0] or (log[1] if log else 0) < self.log_offset:
+            self.load()
+        elif log != self._signature[1]:
+            self._replay_log()
+            self.version += 1
+            self._signature = self.signature()
+
+    @synchronized
+    def load(self):
+        with self.file_lock:
+            return self._load()
+
+    def _load(self):
+        try:
+            with open(self.file_name, 'r') as f:
+                data = json.load(f)
+                profiling.count('bytes_read', f.tell())
+        except FileNotFoundError:
+            data = {'income': [], 'expenses': [], 'categories': []}
+        self.data_version = data.get('data_version', 0)
+        categories = [cat for cat in data.get('categories', []) if isinstance(cat, dict) and 'name' in cat]
+        next_id = data.get('next_id', {})
+        migrate = (any('id' not in record for kind in ('income', 'expenses', 'categories') for record in data.get(kind, []))
+                   or any('category_id' not in expense for expense in data.get('expenses', [])))
+        self.categories_table = CategoryTable(categories, next_id.get('categories', 1))
+        self.tables = {
+            'income': RecordColumns(self.categories_table, False, data.get('income', []), next_id.get('income', 1)),
+            'expenses': RecordColumns(self.categories_table, True, data.get('expenses', []), next_id.get('expenses', 1)),
+        }
+        profiling.count('records', sum(len(table) for table in self.tables.values()))
+        self.rollups = Rollups(data.get('rollups'))
+        stale = any(self.rollups.count(kind) != len(table)
+                    or not math.isclose(self.rollups.total(kind), table.amount[:table.size][table.mask()].sum(),
+                                        rel_tol=1e-9, abs_tol=0.005)
+                    for kind, table in self.tables.items())
+        if migrate or stale:
+            # Missing or stale (e.g. a hand-edited file adding, removing or changing amounts): rebuild once from the
+            # columns. Counts and grand totals are checked, so an edit moving a record between dates goes unnoticed.
+            self.rollups = Rollups.build(self.tables)
+        self.log_entries = self.log_offset = 0
+        self._replay_log()
+        if self.journal and self.log_entries >= self.compact_threshold and not self.read_only:
+            self.compact()
+        if migrate and not self.read_only:
+            # Persist the record and category ids just assigned so later journal ops can refer to them.
+            self.save()
+        self.version += 1
+        self._signature = self.signature()
+        return self
+
+    @synchronized
+    def save(self):
+        # With a journal (ours or another writer's), a snapshot alone would leave already-applied ops in the log;
+        # compact writes both.
+        if self.journal or self.log_offset:
+            self.compact()
+            return
+        with self.file_lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        profiling.count('bytes_written', write_json(self.file_name, self.to_dict()))
+        profiling.count('records', sum(len(table) for table in self.tables.values()))
+        self._signature = self.signature()
+
+    @synchronized
+    def compact(self):
+        with self.file_lock:
+            self._write_snapshot()
+            # The snapshot now contains every logged op, so the log can start over. A crash before the truncate
+            # is harmless: replay skips ops whose version the snapshot already has.
+            with open(self.log_name, 'w') as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self.log_entries = self.log_offset = 0
+            self._signature = self.signature()
+
+    def _replay_log(self):
+        try:
+            with open(self.log_name, 'rb') as f:
+                f.seek(self.log_offset)
+                for line in f:
+                    try:
+                        # A line without its newline is a torn write from a crash and can only be the last one.
+                        op = json.loads(line) if line.endswith(b'\n') else None
+                    except json.JSONDecodeError:
+                        op = None
+                    if op is None:
+                        break
+                    profiling.count('bytes_read', len(line))
+                    # Logs written before ops carried a version are replayed in full, as before.
+                    if op.get('version', self.data_version + 1) > self.data_version:
+                        self._apply(op)
+                        self.data_version = op.get('version', self.data_version + 1)
+                    self.log_offset += len(line)
+                    self.log_entries += 1
+        except FileNotFoundError:
+            pass
+
+    @synchronized
+    def apply(self, op):
+        # Read-modify-write under the file lock: catch up with other writers, check the op still applies, then commit.
+        if self.read_only:
+            raise ConflictError(f"{self.file_name} is open read-only")
+        with self.file_lock:
+            self._catch_up()
+            check_op(self, op)
+            self.data_version += 1
+            op['version'] = self.data_version
+            self._apply(op)
+            self.version += 1
+            if not self.journal:
+                self.save()
+                return
+            line = (json.dumps(op) + '\n').encode()
+            with open(self.log_name, 'ab') as f:
+                # Drop a torn tail left by a crashed writer so the new op starts on its own line.
+                f.truncate(self.log_offset)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            profiling.count('bytes_written', len(line))
+            self.log_offset += len(line)
+            self.log_entries += 1
+            if self.log_entries >= self.compact_threshold:
+                self.compact()
+            else:
+                self._signature = self.signature()
+
+    def _apply(self, op):
+        getattr(self, '_apply_' + op['op'])(op)
+
+    def _record_id(self, op):
+        # Journals written before records had ids address them by list position.
+        if 'id' not in op:
+            op['id'] = self.tables[op['kind']].id_at(op['index'])
+        return op['id']
+
+    def _category_id(self, op, name_key):
+        # Journals written before categories had ids address them by name.
+        if 'id' not in op:
+            op['id'] = self.categories_table.ids.get(op[name_key])
+        return op['id']
+
+    def _apply_add(self, op):
+        table = self.tables[op['kind']]
+        record_id = table.append(op['record'])
+        self.rollups.add(op['kind'], table.record(table.rows[record_id]))
+
+    def _apply_add_many(self, op):
+        self.tables[op['kind']].extend(op['records'])
+        for record in op['records']:
+            self.rollups.add(op['kind'], record)
+
+    def _apply_update(self, op):
+        table, record_id = self.tables[op['kind']], self._record_id(op)
+        if 'category' in op['record'] and 'category_id' not in op['record']:
+            op['record']['category_id'] = self.categories_table.id_of(op['record']['category'])
+        self.rollups.remove(op['kind'], table.record(table.rows[record_id]))
+        table.update(record_id, op['record'])
+        self.rollups.add(op['kind'], table.record(table.rows[record_id]))
+
+    def _apply_delete(self, op):
+        table, record_id = self.tables[op['kind']], self._record_id(op)
+        self.rollups.remove(op['kind'], table.record(table.rows[record_id]))
+        table.delete(record_id)
+
+    def _apply_add_category(self, op):
+        op['id'] = self.categories_table.add(op['name'], op['description'], op.get('id'))
+
+    def _apply_update_category(self, op):
+        category_id = self._category_id(op, 'old_name')
+        if category_id in self.categories_table.by_id:
+            self.categories_table.update(category_id, op.get('name', op.get('new_name')), op['description'])
+
+    def _apply_delete_category(self, op):
+        category_id = self._category_id(op, 'name')
+        if category_id not in self.categories_table.by_id:
+            return
+        expenses = self.tables['expenses']
+        record_ids = list(expenses.member_ids(category_id))
+        for record_id in record_ids:
+            self.rollups.remove('expenses', expenses.record(expenses.rows[record_id], names=False))
+        expenses.delete_many(record_ids)
+        self.categories_table.remove(category_id)
+
+    def to_dict(self):
+        next_id = {kind: table.next_id for kind, table in self.tables.items()}
+        next_id['categories'] = self.categories_table.next_id
+        return {
+            'income': self.tables['income'].to_records(names=False),
+            'expenses': self.tables['expenses'].to_records(names=False),
+            'categories': self.categories_table.to_list(),
+            'next_id': next_id,
+            'data_version': self.data_version,
+            'rollups': self.rollups.to_dict(),
+        }
+
+    @synchronized
+    def count(self, kind):
+        return len(self.tables[kind])
+
+    @synchronized
+    def records(self, kind):
+        profiling.count('records', len(self.tables[kind]))
+        return self.tables[kind].to_records()
+
+    @synchronized
+    def has_record(self, kind, record_id):
+        return record_id in self.tables[kind]
+
+    @synchronized
+    def categories(self):
+        return self.categories_table.to_list()
+
+    @synchronized
+    def has_category(self, name):
+        return name in self.categories_table
+
+    @synchronized
+    def category_id(self, name):
+        return self.categories_table.ids.get(name)
+
+    @synchronized
+    def query(self, kind, start=None, end=None):
+        table = self.tables[kind]
+        rows = table.range_rows(start, end)
+        profiling.count('records', len(rows))
+        return table.to_records(rows)
+
+    @synchronized
+    def page(self, kind, start=None, end=None, search=None, sort='date', descending=False, offset=0, limit=50):
+        table = self.tables[kind]
+        profiling.count('records', len(table.range_rows(start, end)))
+        rows = table.select(start, end, search, sort, descending)
+        return table.to_records(rows[offset:offset + limit]), len(rows)
+
+    def iter_records(self, kind, start=None, end=None, chunk_size=10000):
+        # Callers hold self.lock for the whole iteration (see ExpenseManager.export_records).
+        table = self.tables[kind]
+        rows = table.range_rows(start, end)
+        for offset in range(0, len(rows), chunk_size):
+            profiling.count('records', len(rows[offset:offset + chunk_size]))
+            yield from table.to_records(rows[offset:offset + chunk_size])
+
+    @synchronized
+    def years(self, kind):
+        return self.rollups.years(kind)
+
+    @synchronized
+    def months(self, kind, year):
+        return self.rollups.months(kind, year)
+
+    @synchronized
+    def summarize(self, kind, period, start=None, end=None):
+        summary = self.rollups.summarize(kind, period, start, end)
+        if summary is None:
+            table = self.tables[kind]
+            profiling.count('records', table.size)
+            summary = table.group_sums(period, table.mask(start, end))
+        return summary
+
+    @synchronized
+    def category_totals(self, start=None, end=None):
+        summary = self.rollups.category_totals(start, end)
+        if summary is None:
+            table = self.tables['expenses']
+            profiling.count('records', table.size)
+            summary = table.category_sums(table.mask(start, end))
+        return {self.categories_table.name(category_id): total for category_id, total in summary.items()}
+
+
+class SqliteBackend:
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT
+        );
+        CREATE TABLE IF NOT EXISTS income (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount NUMERIC NOT NULL,
+            description TEXT,
+            date TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount NUMERIC NOT NULL,
+            description TEXT,
+            category_id INTEGER NOT NULL REFERENCES categories(id),
+            date TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_income_date ON income(date);
+        CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+        CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses(category_id, date);
+    '''
+    # Databases created before categories had ids stored the category name on each expense.
+    MIGRATE_CATEGORY_IDS = '''
+        ALTER TABLE categories RENAME TO categories_old;
+        ALTER TABLE expenses RENAME TO expenses_old;
+        DROP INDEX IF EXISTS idx_expenses_date;
+        DROP INDEX IF EXISTS idx_expenses_category;
+    ''' + SCHEMA + '''
+        INSERT INTO categories (name, description) SELECT name, description FROM categories_old ORDER BY rowid;
+        INSERT OR IGNORE INTO categories (name, description) SELECT DISTINCT category, '' FROM expenses_old;
+        INSERT INTO expenses (id, amount, description, category_id, date)
+            SELECT e.id, e.amount, e.description, c.id, e.date
+            FROM expenses_old e JOIN categories c ON c.name = e.category;
+        DROP TABLE expenses_old;
+        DROP TABLE categories_old;
+    '''
+    COLUMNS = {
+        'income': ('id', 'amount', 'description', 'date'),
+        'expenses': ('id', 'amount', 'description', 'category_id', 'date'),
+    }
+    SELECT = {
+        'income': 'SELECT e.id, e.amount, e.description, e.date FROM income e',
+        'expenses': ('SELECT e.id, e.amount, e.description, e.category_id, c.name AS category, e.date '
+                     'FROM expenses e JOIN categories c ON c.id = e.category_id'),
+    }
+    SORT = {'date': ('e.date', 'e.id'), 'amount': ('e.amount', 'e.date', 'e.id')}
+    PERIOD_EXPR = {'Ngay': 'date', 'Thang': 'substr(date, 1, 7)', 'Nam': 'substr(date, 1, 4)'}
+
+    def __init__(self, file_name='expenses.db', read_only=False):
+        self.file_name = file_name
+        self.read_only = read_only
+        # Writers queue on SQLite's own file lock for up to 30s instead of failing with 'database is locked'.
+        if read_only:
+            self.conn = sqlite3.connect(Path(file_name).resolve().as_uri() + '?mode=ro', uri=True, timeout=30,
+                                        check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(file_name, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        if 'category' in [row['name'] for row in self.conn.execute('PRAGMA table_info(expenses)')]:
+            if read_only:
+                raise ConflictError(f"{file_name} needs migrating; open it once for writing")
+            self.conn.executescript('BEGIN;' + self.MIGRATE_CATEGORY_IDS + 'COMMIT;')
+        if not read_only:
+            self.conn.executescript(self.SCHEMA)
+        self.lock = threading.RLock()
+        self.version = 0
+        self.seen_version = None
+        self.refresh()
+
+    @property
+    def data_version(self):
+        # Stored in the database header and bumped by every apply, so it only ever grows.
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    @synchronized
+    def refresh(self):
+        # PRAGMA data_version only moves when another connection commits, so our own writes bump version in apply.
+        seen_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        if seen_version != self.seen_version:
+            self.seen_version = seen_version
+            self.version += 1
+        return self.version
+
+    def load(self):
+        return self
+
+    @synchronized
+    def save(self):
+        self.conn.commit()
+
+    @synchronized
+    def close(self):
+        self.conn.close()
+
+    @synchronized
+    def apply(self, op):
+        if self.read_only:
+            raise ConflictError(f"{self.file_name} is open read-only")
+        with self.conn:
+            # IMMEDIATE takes the write lock up front, so the checks and the write see the same data.
+            self.conn.execute('BEGIN IMMEDIATE')
+            check_op(self, op)
+            getattr(self, '_apply_' + op['op'])(op)
+            self.conn.execute(f'PRAGMA user_version = {self.data_version + 1}')
+        self.version += 1
+
+    def _apply_add(self, op):
+        columns = self.COLUMNS[op['kind']]
+        cursor = self.conn.execute(
+            f"INSERT INTO {op['kind']} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [op['record'].get(column) for column in columns])
+        op['record']['id'] = cursor.lastrowid
+
+    def _apply_add_many(self, op):
+        columns = self.COLUMNS[op['kind']]
+        self.conn.executemany(
+            f"INSERT INTO {op['kind']} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            ([record.get(column) for column in columns] for record in op['records']))
+
+    def _apply_update(self, op):
+        columns = [column for column in self.COLUMNS[op['kind']] if column in op['record'] and column != 'id']
+        self.conn.execute(
+            f"UPDATE {op['kind']} SET {', '.join(column + ' = ?' for column in columns)} WHERE id = ?",
+            [op['record'][column] for column in columns] + [op['id']])
+
+    def _apply_delete(self, op):
+        self.conn.execute(f"DELETE FROM {op['kind']} WHERE id = ?", (op['id'],))
+
+    def _apply_add_category(self, op):
+        cursor = self.conn.execute('INSERT INTO categories (id, name, description) VALUES (?, ?, ?)',
+                                   (op.get('id'), op['name'], op['description']))
+        op['id'] = cursor.lastrowid
+
+    def _apply_update_category(self, op):
+        self.conn.execute('UPDATE categories SET name = ?, description = ? WHERE id = ?',
+                          (op['name'], op['description'], op['id']))
+
+    def _apply_delete_category(self, op):
+        self.conn.execute('DELETE FROM expenses WHERE category_id = ?', (op['id'],))
+        self.conn.execute('DELETE FROM categories WHERE id = ?', (op['id'],))
+
+    def _where(self, start, end):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append('date >= ?')
+            params.append(start)
+        if end is not None:
+            clauses.append('date <= ?')
+            params.append(end)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    @synchronized
+    def count(self, kind):
+        return self.conn.execute(f'SELECT COUNT(*) FROM {kind}').fetchone()[0]
+
+    @synchronized
+    def records(self, kind):
+        records = [dict(row) for row in self.conn.execute(f'{self.SELECT[kind]} ORDER BY e.id')]
+        profiling.count('records', len(records))
+        return records
+
+    @synchronized
+    def has_record(self, kind, record_id):
+        return self.conn.execute(f'SELECT 1 FROM {kind} WHERE id = ?', (record_id,)).fetchone() is not None
+
+    @synchronized
+    def categories(self):
+        return [dict(row) for row in self.conn.execute('SELECT id, name, description FROM categories ORDER BY id')]
+
+    @synchronized
+    def has_category(self, name):
+        return self.category_id(name) is not None
+
+    @synchronized
+    def category_id(self, name):
+        row = self.conn.execute('SELECT id FROM categories WHERE name = ?', (name,)).fetchone()
+        return row['id'] if row else None
+
+    @synchronized
+    def query(self, kind, start=None, end=None):
+        where, params = self._where(start, end)
+        records = [dict(row) for row in
+                   self.conn.execute(f'{self.SELECT[kind]}{where} ORDER BY e.date, e.id', params)]
+        profiling.count('records', len(records))
+        return records
+
+    @synchronized
+    def page(self, kind, start=None, end=None, search=None, sort='date', descending=False, offset=0, limit=50):
+        where, params = self._where(start, end)
+        if search:
+            where += (' AND ' if where else ' WHERE ') + 'instr(lower(e.description), lower(?)) > 0'
+            params.append(search)
+        direction = ' DESC' if descending else ''
+        order = ', '.join(column + direction for column in self.SORT[sort])
+        total = self.conn.execute(f'SELECT COUNT(*) FROM {kind} e{where}', params).fetchone()[0]
+        profiling.count('records', total)
+        rows = self.conn.execute(f'{self.SELECT[kind]}{where} ORDER BY {order} LIMIT ? OFFSET ?',
+                                 params + [limit, offset])
+        return [dict(row) for row in rows], total
+
+    def iter_records(self, kind, start=None, end=None, chunk_size=10000):
+        where, params = self._where(start, end)
+        cursor = self.conn.execute(f'{self.SELECT[kind]}{where} ORDER BY e.date, e.id', params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            profiling.count('records', len(rows))
+            for row in rows:
+                yield dict(row)
+
+    @synchronized
+    def years(self, kind):
+        return [row[0] for row in
+                self.conn.execute(f'SELECT DISTINCT substr(date, 1, 4) FROM {kind} ORDER BY 1')]
+
+    @synchronized
+    def months(self, kind, year):
+        return [row[0] for row in
+                self.conn.execute(f'SELECT DISTINCT substr(date, 6, 2) FROM {kind} WHERE date BETWEEN ? AND ? ORDER BY 1',
+                                  period_range('Nam', year))]
+
+    @synchronized
+    def summarize(self, kind, period, start=None, end=None):
+        expr = self.PERIOD_EXPR[period]
+        where, params = self._where(start, end)
+        return {row[0]: row[1] for row in
+                self.conn.execute(f'SELECT {expr}, SUM(amount) FROM {kind}{where} GROUP BY 1 ORDER BY 1', params)}
+
+    @synchronized
+    def category_totals(self, start=None, end=None):
+        where, params = self._where(start, end)
+        return {row[0]: row[1] for row in
+                self.conn.execute('SELECT c.name, SUM(e.amount) FROM expenses e JOIN categories c ON c.id = e.category_id'
+                                  f'{where} GROUP BY e.category_id', params)}
+
+
+class PartitionedBackend:
+    # Under a directory, per kind: <YYYY-MM>.json with the month's records, <YYYY-MM>.days.json with its day buckets
+    # and ids.bin mapping record ids to months. manifest.json holds only month-sized state: categories, per-partition
+    # counts and the month and category rollups. Summaries never open a partition; partitions load on demand.
+    # read_only never writes or creates anything under the directory.
+    def __init__(self, directory='expenses', cache_size=24, read_only=False):
+        self.directory = directory
+        self.manifest_name = os.path.join(directory, 'manifest.json')
+        self.cache_size = cache_size
+        self.read_only = read_only
+        self.version = 0
+        self.lock = threading.RLock()
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self.file_lock = FileLock(os.path.join(directory, 'manifest.lock'), create=not read_only)
+        # (kind, month) -> RecordColumns, least recently used first.
+        self.cache = OrderedDict()
+        # (kind, month) -> {day: [total, count]}; a month's worth each, so they are all kept.
+        self.day_cache = {}
+        self.partitions = {kind: {} for kind in KINDS}
+        self.load()
+
+    def signature(self):
+        return file_signature(self.manifest_name)
+
+    @synchronized
+    def refresh(self):
+        if self.signature() != self._signature:
+            self.load()
+        return self.version
+
+    @synchronized
+    def load(self):
+        with self.file_lock:
+            try:
+                with open(self.manifest_name, 'r') as f:
+                    manifest = json.load(f)
+                    profiling.count('bytes_read', f.tell())
+            except FileNotFoundError:
+                manifest = {}
+            next_id = manifest.get('next_id', {})
+            self.data_version = manifest.get('data_version', 0)
+            self.categories_table = CategoryTable(manifest.get('categories', []), next_id.get('categories', 1))
+            self.next_id = {kind: next_id.get(kind, 1) for kind in KINDS}
+            self.rollups = Rollups(manifest.get('rollups'), days=False)
+            partitions = {kind: manifest.get('partitions', {}).get(kind, {}) for kind in KINDS}
+            # Partitions another writer did not touch (same data version in the manifest) stay cached.
+            for (kind, month), table in list(self.cache.items()):
+                if partitions[kind].get(month) != self.partitions[kind].get(month):
+                    del self.cache[(kind, month)]
+                else:
+                    table.categories = self.categories_table
+            for kind, month in list(self.day_cache):
+                if partitions[kind].get(month) != self.partitions[kind].get(month):
+                    del self.day_cache[(kind, month)]
+            self.partitions = partitions
+            self.version += 1
+            self._signature = self.signature()
+            return self
+
+    @synchronized
+    def save(self):
+        next_id = dict(self.next_id, categories=self.categories_table.next_id)
+        with self.file_lock:
+            profiling.count('bytes_written', write_json(self.manifest_name, {
+                'categories': self.categories_table.to_list(),
+                'next_id': next_id,
+                'data_version': self.data_version,
+                'partitions': self.partitions,
+                'rollups': {'month': self.rollups.month, 'category': self.rollups.category},
+            }, indent=None))
+            self._signature = self.signature()
+
+    def _path(self, kind, month, suffix='.json'):
+        return os.path.join(self.directory, kind, month + suffix)
+
+    def _partition(self, kind, month):
+        key = (kind, month)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        try:
+            with open(self._path(kind, month), 'r') as f:
+                records = json.load(f)
+                profiling.count('bytes_read', f.tell())
+        except FileNotFoundError:
+            records = []
+        profiling.count('records', len(records))
+        table = self.cache[key] = RecordColumns(self.categories_table, kind == 'expenses', records)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return table
+
+    def _write_partition(self, kind, month):
+        table = self._partition(kind, month)
+        self.day_cache.pop((kind, month), None)
+        if not len(table):
+            self.partitions[kind].pop(month, None)
+            for suffix in ('.json', '.days.json'):
+                if os.path.exists(self._path(kind, month, suffix)):
+                    os.remove(self._path(kind, month, suffix))
+            return
+        self.partitions[kind][month] = {'count': len(table), 'version': self.data_version}
+        days = self.day_cache[(kind, month)] = table.group_totals('Ngay', table.mask())
+        profiling.count('bytes_written', write_json(self._path(kind, month), table.to_records(names=False), indent=None))
+        profiling.count('bytes_written', write_json(self._path(kind, month, '.days.json'), days, indent=None))
+
+    def _days(self, kind, month):
+        if (kind, month) not in self.day_cache:
+            try:
+                with open(self._path(kind, month, '.days.json'), 'r') as f:
+                    days = json.load(f)
+                    profiling.count('bytes_read', f.tell())
+            except FileNotFoundError:
+                # Partitions written before day files existed: derive the buckets from the records once.
+                table = self._partition(kind, month)
+                days = table.group_totals('Ngay', table.mask())
+            self.day_cache[(kind, month)] = days
+        return self.day_cache[(kind, month)]
+
+    def _ids_path(self, kind):
+        return os.path.join(self.directory, kind, 'ids.bin')
+
+    def _set_months(self, kind, months):
+        # ids.bin holds a uint16 month code (year * 12 + month, 0 for none) at offset 2 * id, so a lookup or a
+        # single-record write is one seek; bulk changes rewrite the file in one go.
+        path = self._ids_path(kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ids = np.fromiter(months, dtype=np.int64, count=len(months))
+        codes = np.array([int(month[:4]) * 12 + int(month[5:7]) if month else 0 for month in months.values()],
+                         dtype='<u2')
+        if len(ids) > 64:
+            index = np.fromfile(path, dtype='<u2') if os.path.exists(path) else np.zeros(0, dtype='<u2')
+            if ids.max() >= len(index):
+                index = np.concatenate([index, np.zeros(ids.max() + 1 - len(index), dtype='<u2')])
+            index[ids] = codes
+            tmp_name = path + '.tmp'
+            index.tofile(tmp_name)
+            os.replace(tmp_name, path)
+            profiling.count('bytes_written', index.nbytes)
+            return
+        with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+            for record_id, code in zip(ids.tolist(), codes):
+                f.seek(2 * record_id)
+                f.write(code.tobytes())
+        profiling.count('bytes_written', 2 * len(ids))
+
+    def _locate(self, kind, record_id):
+        path = self._ids_path(kind)
+        if not os.path.exists(path) and self.partitions[kind] and self.read_only:
+            return next((month for month in self._months(kind) if record_id in self._partition(kind, month)), None)
+        if not os.path.exists(path) and self.partitions[kind]:
+            # Ledgers partitioned before the id index existed: build it once from the partitions.
+            with self.file_lock:
+                self._set_months(kind, {int(record_id): month for month in self._months(kind)
+                                        for record_id in self._partition(kind, month).rows})
+        try:
+            with open(path, 'rb') as f:
+                f.seek(2 * record_id)
+                code = f.read(2)
+        except FileNotFoundError:
+            return None
+        code = int(np.frombuffer(code, dtype='<u2')[0]) if len(code) == 2 else 0
+        month = f"{(code - 1) // 12:04d}-{(code - 1) % 12 + 1:02d}" if code else None
+        return month if month in self.partitions[kind] else None
+
+    def _months(self, kind, start=None, end=None):
+        return [month for month in sorted(self.partitions[kind])
+                if (start is None or month >= start[:7]) and (end is None or month <= end[:7])]
+
+    def _covers(self, month, start, end):
+        first, last = period_range('Thang', month)
+        return (start is None or start <= first) and (end is None or last <= end)
+
+    def _range_count(self, kind, month, start, end):
+        if self._covers(month, start, end):
+            return self.partitions[kind][month]['count']
+        start, end = max(start or '', month + '-01'), min(end or '9999', month + '-31')
+        return sum(bucket[1] for day, bucket in self._days(kind, month).items() if start <= day <= end)
+
+    @synchronized
+    def apply(self, op):
+        # Handlers rewrite only the partitions they touch; the manifest goes last.
+        if self.read_only:
+            raise ConflictError(f"{self.directory} is open read-only")
+        with self.file_lock:
+            if self.signature() != self._signature:
+                self.load()
+            check_op(self, op)
+            self.data_version += 1
+            getattr(self, '_apply_' + op['op'])(op)
+            self.save()
+        self.version += 1
+
+    def _assign_id(self, kind, record):
+        if record.get('id') is None:
+            record['id'] = self.next_id[kind]
+        self.next_id[kind] = max(self.next_id[kind], record['id'] + 1)
+
+    def _apply_add(self, op):
+        kind, record = op['kind'], op['record']
+        self._assign_id(kind, record)
+        self._partition(kind, record['date'][:7]).append(record)
+        self.rollups.add(kind, record)
+        self._write_partition(kind, record['date'][:7])
+        self._set_months(kind, {record['id']: record['date'][:7]})
+
+    def _apply_add_many(self, op):
+        kind, months = op['kind'], {}
+        for record in op['records']:
+            self._assign_id(kind, record)
+            months.setdefault(record['date'][:7], []).append(record)
+            self.rollups.add(kind, record)
+        for month, records in months.items():
+            self._partition(kind, month).extend(records)
+            self._write_partition(kind, month)
+        self._set_months(kind, {record['id']: record['date'][:7] for record in op['records']})
+
+    def _apply_update(self, op):
+        kind, record_id = op['kind'], op['id']
+        month = self._locate(kind, record_id)
+        table = self._partition(kind, month)
+        old = table.record(table.rows[record_id], names=False)
+        self.rollups.remove(kind, old)
+        new = dict(old, **{key: value for key, value in op['record'].items() if key in old})
+        if new['date'][:7] == month:
+            table.update(record_id, new)
+        else:
+            table.delete(record_id)
+            self._write_partition(kind, month)
+            self._partition(kind, new['date'][:7]).append(new)
+        self.rollups.add(kind, new)
+        self._write_partition(kind, new['date'][:7])
+        if new['date'][:7] != month:
+            self._set_months(kind, {record_id: new['date'][:7]})
+
+    def _apply_delete(self, op):
+        kind, record_id = op['kind'], op['id']
+        month = self._locate(kind, record_id)
+        table = self._partition(kind, month)
+        self.rollups.remove(kind, table.record(table.rows[record_id], names=False))
+        table.delete(record_id)
+        self._write_partition(kind, month)
+        self._set_months(kind, {record_id: None})
+
+    def _apply_add_category(self, op):
+        op['id'] = self.categories_table.add(op['name'], op['description'], op.get('id'))
+
+    def _apply_update_category(self, op):
+        self.categories_table.update(op['id'], op['name'], op['description'])
+
+    def _apply_delete_category(self, op):
+        # The category rollup lists exactly the months holding its expenses.
+        months = sorted(self.rollups.category.get(str(op['id']), {}))
+        for month in months:
+            table = self._partition('expenses', month)
+            record_ids = list(table.member_ids(op['id']))
+            for record_id in record_ids:
+                self.rollups.remove('expenses', table.record(table.rows[record_id], names=False))
+            table.delete_many(record_ids)
+            self._write_partition('expenses', month)
+            self._set_months('expenses', dict.fromkeys(record_ids))
+        self.categories_table.remove(op['id'])
+
+    @synchronized
+    def count(self, kind):
+        return sum(meta['count'] for meta in self.partitions[kind].values())
+
+    @synchronized
+    def records(self, kind):
+        return [record for month in self._months(kind) for record in self._partition(kind, month).to_records()]
+
+    @synchronized
+    def has_record(self, kind, record_id):
+        return self._locate(kind, record_id) is not None
+
+    @synchronized
+    def categories(self):
+        return self.categories_table.to_list()
+
+    @synchronized
+    def has_category(self, name):
+        return name in self.categories_table
+
+    @synchronized
+    def category_id(self, name):
+        return self.categories_table.ids.get(name)
+
+    @synchronized
+    def query(self, kind, start=None, end=None):
+        return list(self.iter_records(kind, start, end))
+
+    @synchronized
+    def page(self, kind, start=None, end=None, search=None, sort='date', descending=False, offset=0, limit=50):
+        months = self._months(kind, start, end)
+        if not search and sort == 'date':
+            # Counts come from the manifest, so partitions before the page are skipped unopened.
+            counts = [self._range_count(kind, month, start, end) for month in months]
+            if descending:
+                months, counts = months[::-1], counts[::-1]
+            records, skip = [], offset
+            for month, count in zip(months, counts):
+                if skip >= count:
+                    skip -= count
+                    continue
+                if len(records) >= limit:
+                    break
+                table = self._partition(kind, month)
+                rows = table.select(start, end, None, sort, descending)
+                records.extend(table.to_records(rows[skip:skip + limit - len(records)]))
+                skip = 0
+            return records, sum(counts)
+        matches = []
+        for month in months:
+            table = self._partition(kind, month)
+            rows = table.select(start, end, search)
+            profiling.count('records', len(rows))
+            # The table itself is kept: if the cache evicts it, a reloaded partition numbers its rows differently.
+            matches.extend((table.amount[row], table.day[row], table.id[row], table, row) for row in rows.tolist())
+        matches.sort(key=(lambda match: match[:3]) if sort == 'amount' else (lambda match: match[1:3]),
+                     reverse=descending)
+        return [table.record(row) for *_, table, row in matches[offset:offset + limit]], len(matches)
+
+    def iter_records(self, kind, start=None, end=None, chunk_size=10000):
+        for month in self._months(kind, start, end):
+            table = self._partition(kind, month)
+            yield from table.to_records(table.range_rows(start, end))
+
+    @synchronized
+    def years(self, kind):
+        return self.rollups.years(kind)
+
+    @synchronized
+    def months(self, kind, year):
+        return self.rollups.months(kind, year)
+
+    @synchronized
+    def summarize(self, kind, period, start=None, end=None):
+        summary = None if period == 'Ngay' else self.rollups.summarize(kind, period, start, end)
+        if summary is None:
+            # Days, and ranges cutting through a month, are summed from the day files instead of the partitions.
+            width = {'Ngay': 10, 'Thang': 7, 'Nam': 4}[period]
+            summary = {}
+            for month in self._months(kind, start, end):
+                for day, (total, _) in sorted(self._days(kind, month).items()):
+                    if (start is None or day >= start) and (end is None or day <= end):
+                        summary[day[:width]] = summary.get(day[:width], 0) + total
+            summary = {key: to_amount(total) for key, total in summary.items()}
+        return summary
+
+    @synchronized
+    def category_totals(self, start=None, end=None):
+        summary = self.rollups.category_totals(start, end)
+        if summary is None:
+            # Whole months come from the rollups; only the partial months at either end are opened.
+            summary = {}
+            for month in self._months('expenses', start, end):
+                if self._covers(month, start, end):
+                    totals = self.rollups.category_totals(*period_range('Thang', month))
+                else:
+                    table = self._partition('expenses', month)
+                    totals = table.category_sums(table.mask(start, end))
+                for category_id, total in totals.items():
+                    summary[category_id] = summary.get(category_id, 0) + total
+            summary = {category_id: to_amount(total) for category_id, total in summary.items()}
+        return {self.categories_table.name(category_id): total for category_id, total in summary.items()}
+
+
+def open_backend(file_name, journal=False, compact_threshold=1000, read_only=False):
+    # A directory (or a path ending in a separator) holds a month-partitioned ledger.
+    if os.path.isdir(file_name) or file_name.endswith(os.sep):
+        return PartitionedBackend(file_name, read_only=read_only)
+    if os.path.splitext(file_name)[1] in ('.db', '.sqlite', '.sqlite3'):
+        return SqliteBackend(file_name, read_only=read_only)
+    return JsonBackend(file_name, journal=journal, compact_threshold=compact_threshold, read_only=read_only)
+
+
+def migrate_json_to_sqlite(json_file='expenses.json', db_file='expenses.db'):
+    source = JsonBackend(json_file, journal=True, read_only=True)
+    target = SqliteBackend(db_file)
+    with target.conn:
+        target.conn.executemany('INSERT INTO categories (id, name, description) VALUES (?, ?, ?)',
+                                [(cat['id'], cat['name'], cat['description']) for cat in source.categories()])
+        for kind, columns in SqliteBackend.COLUMNS.items():
+            target.conn.executemany(
+                f"INSERT INTO {kind} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                ([record.get(column) for column in columns] for record in source.records(kind)))
+    return target
+
+
+def partition_json(json_file='expenses.json', directory='expenses'):
+    source = JsonBackend(json_file, journal=True, read_only=True)
+    target = PartitionedBackend(directory)
+    with target.lock:
+        for category in source.categories():
+            target._apply_add_category(dict(category))
+        for kind in KINDS:
+            target._apply_add_many({'kind': kind, 'records': source.records(kind)})
+            target.next_id[kind] = max(target.next_id[kind], source.tables[kind].next_id)
+        target.categories_table.next_id = max(target.categories_table.next_id, source.categories_table.next_id)
+        target.save()
+    return target
+
+
+if __name__ == '__main__':
+    commands = {'migrate': migrate_json_to_sqlite, 'partition': partition_json}
+    if len(sys.argv) != 4 or sys.argv[1] not in commands:
+        print("Usage: python storage.py migrate <expenses.json> <expenses.db>")
+        print("       python storage.py partition <expenses.json> <directory>")
+        sys.exit(1)
+    target = commands[sys.argv[1]](sys.argv[2], sys.argv[3])
+    if sys.argv[1] == 'migrate':
+        target.close()
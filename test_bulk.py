@@ -0,0 +1,24 @@
+import pytest
+
+from bulk import parse_record, read_rows
+
+
+def test_malformed_jsonl_line_is_a_row_error(tmp_path):
+    path = tmp_path / 'expenses.jsonl'
+    path.write_text('{"date": "2024-01-01", "amount": 1, "category": "An uong"}\n{not json\n')
+    rows = list(read_rows(str(path)))
+    assert [line for line, _ in rows] == [1, 2]
+    assert parse_record('expenses', rows[0][1], {'An uong': 1})['category_id'] == 1
+    with pytest.raises(ValueError):
+        parse_record('expenses', rows[1][1], {'An uong': 1})
+
+
+@pytest.mark.parametrize('amount', ['nan', 'inf', '-inf', '-5'])
+def test_non_finite_or_negative_amount_is_a_row_error(amount):
+    with pytest.raises(ValueError):
+        parse_record('income', {'date': '2024-01-01', 'amount': amount}, {})
+
+
+def test_jsonl_nan_token_is_a_row_error():
+    with pytest.raises(ValueError):
+        parse_record('income', '{"date": "2024-01-01", "amount": NaN}', {})